@@ -0,0 +1,96 @@
+""" 背景 AI 執行緒：搜尋不佔用 Tk 主迴圈，可在玩家思考時預先計算 (pondering)，也可隨時取消 """
+import queue
+import threading
+
+PONDER_REPLIES = 2  # 預測玩家最可能的幾手
+
+
+class AIWorker:
+    """
+    所有搜尋都在同一條背景執行緒依序執行，Engine 只會被這條執行緒使用。
+    結果放進 results 佇列，由主迴圈用 poll() 取回 (Tk 元件不能跨執行緒操作)。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.stop_event = threading.Event()
+        self.ponder_cache = {}  # 預測後的局面雜湊 => AI 的回應
+        self.last_stats = {}    # 最近一次 poll() 取回的那一手的搜尋統計
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # ================= 主迴圈呼叫 =================
+
+    def think(self, board, player):
+        """ 要求 AI 下 player 這一手；若玩家的落子剛好被預測到，直接用算好的結果 """
+        self.cancel()
+        with self.lock:
+            move = self.ponder_cache.get(board.hash)
+        if move is not None and board.is_empty(*move):
+            self.results.put((self.generation, move, {"source": "ponder", "move": move}))
+            return
+        self.jobs.put(("think", self.generation, self.stop_event, board.copy(), player))
+
+    def ponder(self, board, player):
+        """ 輪到玩家 (player) 時，先猜他的回應並算好 AI 的下一手 """
+        self.cancel()
+        with self.lock:
+            self.ponder_cache = {}
+        self.jobs.put(("ponder", self.generation, self.stop_event, board.copy(), player))
+
+    def cancel(self):
+        """ 中止進行中的搜尋，並讓所有尚未取回的結果失效 """
+        self.generation += 1
+        self.stop_event.set()
+        self.stop_event = threading.Event()
+
+    def poll(self):
+        """ 取回目前這一代的結果，沒有則回傳 None """
+        while True:
+            try:
+                generation, move, stats = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self.generation:
+                self.last_stats = stats
+                return move
+
+    # ================= 背景執行緒 =================
+
+    def _run(self):
+        while True:
+            kind, generation, stop, board, player = self.jobs.get()
+            if stop.is_set():
+                continue  # 排隊期間就被取消了
+            if kind == "think":
+                move = self.engine.search(board, player, stop=stop)
+                if not stop.is_set():
+                    self.results.put((generation, move, self.engine.stats))
+            else:
+                self._ponder(board, player, stop)
+
+    def _ponder(self, board, player, stop):
+        engine = self.engine
+        # 先用一點時間猜玩家的最佳回應，再補上啟發分數最高的其他候選
+        guess = engine.search(board, player, time_limit=engine.time_limit / 4, stop=stop)
+        replies = [guess] if guess else []
+        for move in engine.ordered_moves(board, player, PONDER_REPLIES + 1):
+            if len(replies) >= PONDER_REPLIES:
+                break
+            if move not in replies:
+                replies.append(move)
+        for r, c in replies:
+            if stop.is_set():
+                return
+            board.make(r, c, player)
+            if not board.is_win(r, c, player) and not board.is_full():
+                # 這次搜尋也會把結果留在置換表，猜錯時正式搜尋一樣比較快
+                move = engine.search(board, 3 - player, stop=stop)
+                if move is not None and not stop.is_set():
+                    with self.lock:
+                        self.ponder_cache[board.hash] = move
+            board.unmake()
@@ -0,0 +1,116 @@
+""" NumPy 批次評估：一次算 (N, 15, 15) 個盤面的每格攻防分數與勝負旗標 (離線分析 / 自我對弈資料用) """
+import argparse
+import random
+
+import numpy as np
+
+from board import Board, BOARD_SIZE, DIRECTIONS
+from engine import line_strength
+
+# 連續長度 (1 + 前後各最多 4) => 分數，與 engine.line_strength 相同
+STRENGTH_TABLE = np.array([0, 0, 10, 100, 1000, 10000, 10000, 10000, 10000, 10000], dtype=np.int32)
+
+
+def _shift(mask, dr, dc):
+    """ out[:, r, c] = mask[:, r + dr, c + dc]，超出棋盤的位置為 False """
+    out = np.zeros_like(mask)
+    n = mask.shape[1]
+    dst_r = slice(max(0, -dr), n - max(0, dr))
+    dst_c = slice(max(0, -dc), n - max(0, dc))
+    src_r = slice(max(0, dr), n - max(0, -dr))
+    src_c = slice(max(0, dc), n - max(0, -dc))
+    out[:, dst_r, dst_c] = mask[:, src_r, src_c]
+    return out
+
+
+def line_strength_batch(boards, player):
+    """ boards: (N, 15, 15) int8；回傳每格的 line_strength(board, r, c, player)，形狀相同 (int32) """
+    stones = np.asarray(boards) == player
+    total = np.zeros(stones.shape, dtype=np.int32)
+    for dr, dc in DIRECTIONS:
+        count = np.ones(stones.shape, dtype=np.int8)
+        for sign in (1, -1):
+            # 往同一方向連續的棋子：第 k 格要和前 k-1 格都成立
+            run = np.ones(stones.shape, dtype=bool)
+            for k in range(1, 5):
+                run &= _shift(stones, dr * sign * k, dc * sign * k)
+                count += run
+        total += STRENGTH_TABLE[count]
+    return total
+
+
+def evaluate_batch(boards, player=2, defense_weight=1.0):
+    """ 每格的 進攻分 + 防守分 x 權重 (等同 engine.cell_score) """
+    atk = line_strength_batch(boards, player)
+    dfs = line_strength_batch(boards, 3 - player)
+    return atk + dfs * defense_weight
+
+
+def win_flags(boards):
+    """ 回傳 (N, 2) bool：[:, 0] 黑棋是否已有五連，[:, 1] 白棋 """
+    boards = np.asarray(boards)
+    flags = np.zeros((boards.shape[0], 2), dtype=bool)
+    for i, player in enumerate((1, 2)):
+        stones = boards == player
+        for dr, dc in DIRECTIONS:
+            five = stones.copy()
+            for k in range(1, 5):
+                five &= _shift(stones, dr * k, dc * k)
+            flags[:, i] |= five.any(axis=(1, 2))
+    return flags
+
+
+def to_array(boards):
+    """ Board 串列 => (N, 15, 15) int8 """
+    return np.stack([np.frombuffer(bytes(b.cells), dtype=np.int8).reshape(b.size, b.size) for b in boards])
+
+
+def to_board(array):
+    board = Board(array.shape[0])
+    for r, c in zip(*np.nonzero(array)):
+        board.make(int(r), int(c), int(array[r, c]))
+    return board
+
+
+def random_boards(n, seed=0, max_stones=120):
+    rng = random.Random(seed)
+    boards = np.zeros((n, BOARD_SIZE, BOARD_SIZE), dtype=np.int8)
+    for i in range(n):
+        cells = rng.sample(range(BOARD_SIZE * BOARD_SIZE), rng.randint(0, max_stones))
+        for j, idx in enumerate(cells):
+            boards[i].flat[idx] = 1 + j % 2
+    return boards
+
+
+def validate(n=100, seed=0):
+    """ 與純量版逐格比對，回傳不一致的格數 (應為 0) """
+    boards = random_boards(n, seed)
+    mismatches = 0
+    for player in (1, 2):
+        batch = line_strength_batch(boards, player)
+        for i in range(n):
+            board = to_board(boards[i])
+            for r in range(BOARD_SIZE):
+                for c in range(BOARD_SIZE):
+                    if batch[i, r, c] != line_strength(board, r, c, player):
+                        mismatches += 1
+    flags = win_flags(boards)
+    for i in range(n):
+        board = to_board(boards[i])
+        for p in (1, 2):
+            expect = any(board.is_win(r, c, p) for r, c in board.history if board.get(r, c) == p)
+            mismatches += flags[i, p - 1] != expect
+    return int(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次評估：與純量版比對")
+    parser.add_argument("--validate", type=int, default=100, help="隨機產生幾個盤面比對")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    bad = validate(args.validate, args.seed)
+    print(f"比對 {args.validate} 個盤面：{'全部一致' if bad == 0 else f'{bad} 處不一致'}")
+
+
+if __name__ == "__main__":
+    main()
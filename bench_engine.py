@@ -0,0 +1,161 @@
+""" 引擎效能基準：勝負判定、連子強度、整步思考時間、固定深度的 nps；結果存成 JSON 方便跨 commit 比較 """
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+from board import Board, BOARD_SIZE
+from engine import Engine, INF, line_strength
+
+# 固定的局面：以固定種子在既有棋子附近隨機落子 (不會出現五連)，每次產生的都一樣
+PHASES = {"early": 6, "mid": 30, "late": 80}
+SEED = 20240601
+
+
+def scripted_moves(plies, seed=SEED):
+    """ 產生 plies 手不會分出勝負的手順 """
+    rng = random.Random(seed)
+    board = Board()
+    center = BOARD_SIZE // 2
+    moves = []
+    while len(moves) < plies:
+        candidates = board.candidates() if moves else [(center, center)]
+        rng.shuffle(candidates)
+        player = board.side_to_move()
+        for r, c in candidates:
+            board.make(r, c, player)
+            if not board.is_win(r, c, player):
+                moves.append((r, c))
+                break
+            board.unmake()
+        else:
+            raise ValueError(f"無法產生 {plies} 手不分勝負的手順")
+    return moves
+
+
+def position(phase):
+    board = Board()
+    for r, c in scripted_moves(PHASES[phase]):
+        board.make(r, c, board.side_to_move())
+    return board
+
+
+def measure(func, repeat=5, number=1):
+    """ 跑 repeat 輪、每輪 number 次，回傳每次呼叫的最佳 / 中位數秒數 """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {"best": min(times), "median": statistics.median(times)}
+
+
+def bench_is_win(board, repeat):
+    """ 每顆棋子都檢查一次 (原本的 check_win) """
+    stones = [(r, c, board.get(r, c)) for r, c in board.history]
+
+    def run():
+        for r, c, p in stones:
+            board.is_win(r, c, p)
+    result = measure(run, repeat, 20)
+    result["per_call"] = result["best"] / len(stones)
+    return result
+
+
+def bench_line_strength(board, repeat):
+    """ 每個空格對雙方各算一次 (原本的 check_line_strength) """
+    empties = board.empties()
+
+    def run():
+        for r, c in empties:
+            line_strength(board, r, c, 1)
+            line_strength(board, r, c, 2)
+    result = measure(run, repeat, 5)
+    result["per_call"] = result["best"] / (2 * len(empties))
+    return result
+
+
+def bench_computer_move(board, level, repeat):
+    """ 完整的一步 (含威脅搜尋，關掉開局庫)；每輪用新的引擎避免沿用置換表，引擎在計時前先建好 """
+    engines = [Engine(level, seed=0) for _ in range(repeat)]
+    for engine in engines:
+        engine.use_book = False
+    stats = []
+
+    def run():
+        engine = engines[len(stats)]
+        engine.search(board, board.side_to_move())
+        stats.append(engine.stats)
+    result = measure(run, repeat)
+    result["source"] = stats[-1]["source"]
+    result["depth"] = stats[-1]["depth"]
+    return result
+
+
+def bench_nps(board, level, depth):
+    """ 固定深度、不限時間，只看搜尋本身的速度 """
+    engine = Engine(level, seed=0)
+    start = time.perf_counter()
+    engine.analyse(board, board.side_to_move(), max_depth=depth, time_limit=INF)
+    elapsed = time.perf_counter() - start
+    return {"depth": depth, "nodes": engine.nodes, "time": elapsed,
+            "nps": engine.nodes / elapsed if elapsed else 0.0, "tt_hit_rate": engine.tt.hit_rate()}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(level="Normal", depth=4, repeat=5, phases=tuple(PHASES)):
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": int(time.time()),
+        "level": level,
+        "phases": {},
+    }
+    for phase in phases:
+        board = position(phase)
+        results["phases"][phase] = {
+            "stones": len(board.history),
+            "is_win": bench_is_win(board, repeat),
+            "line_strength": bench_line_strength(board, repeat),
+            "computer_move": bench_computer_move(board, level, max(1, repeat // 2)),
+            "nps": bench_nps(board, level, depth),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="引擎效能基準")
+    parser.add_argument("--level", default="Normal")
+    parser.add_argument("--depth", type=int, default=4, help="測 nps 的固定深度")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--phases", default=",".join(PHASES))
+    parser.add_argument("--out", default="bench_engine.json")
+    args = parser.parse_args()
+
+    results = run(args.level, args.depth, args.repeat, [p for p in args.phases.split(",") if p])
+    for phase, r in results["phases"].items():
+        print(f"[{phase}] {r['stones']} 子  is_win {r['is_win']['per_call'] * 1e6:.2f}µs"
+              f"  line_strength {r['line_strength']['per_call'] * 1e6:.2f}µs"
+              f"  一步 {r['computer_move']['median']:.3f}s ({r['computer_move']['source']})"
+              f"  {r['nps']['nps'] / 1000:.1f}k nps @ 深度 {r['nps']['depth']}")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"結果已寫入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+""" 伺服器壓力測試：在本機開 server.py，用大量模擬客戶端照固定手順對下，量吞吐量、落子轉送延遲與每房記憶體 """
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import protocol
+from bench_engine import git_commit, scripted_moves
+
+HOST = "127.0.0.1"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid):
+    """ 行程目前的常駐記憶體 (KB)；只支援有 /proc 的平台，其他回傳 None """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Client:
+    """ 一個模擬玩家：輪到自己就下手順裡的下一手，量「送出 MOVE 到收到伺服器回傳」的時間 """
+
+    def __init__(self, script, latencies):
+        self.script = script
+        self.latencies = latencies
+        self.parser = protocol.FrameParser()
+        self.color = None
+        self.ply = 0
+        self.sent_at = None
+        self.started = asyncio.Event()
+        self.go = None
+
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection(HOST, port)
+        self.writer.write(protocol.hello())
+
+    async def recv(self):
+        data = await self.reader.read(65536)
+        if not data:
+            raise ConnectionError("伺服器關閉連線")
+        return self.parser.feed(data)
+
+    def my_turn(self):
+        return self.ply < len(self.script) and self.ply % 2 == self.color - 1
+
+    def send_next(self):
+        self.sent_at = time.perf_counter()
+        self.writer.write(protocol.encode_move(*self.script[self.ply]))
+
+    async def run(self, go):
+        """ 等配對完成，收到 go 才開始下 """
+        while not self.started.is_set():
+            for kind, payload in await self.recv():
+                if kind == protocol.COLOR:
+                    self.color = payload[0]
+                elif kind == protocol.START:
+                    self.started.set()
+        await go.wait()
+        if self.my_turn():
+            self.send_next()
+        while self.ply < len(self.script):
+            for kind, payload in await self.recv():
+                if kind == protocol.MOVE:
+                    if self.ply % 2 == self.color - 1:
+                        self.latencies.append(time.perf_counter() - self.sent_at)
+                    self.ply += 1
+                    if self.my_turn():
+                        self.send_next()
+                elif kind == protocol.REJECT:
+                    raise RuntimeError("伺服器拒絕了手順中的一手")
+        self.writer.close()
+
+
+async def load(port, pid, clients, plies, connect_batch):
+    script = scripted_moves(plies)
+    latencies = []
+    go = asyncio.Event()
+    players = [Client(script, latencies) for _ in range(clients)]
+
+    base_rss = rss_kb(pid)
+    start = time.perf_counter()
+    for i in range(0, clients, connect_batch):
+        await asyncio.gather(*(p.connect(port) for p in players[i:i + connect_batch]))
+    tasks = [asyncio.create_task(p.run(go)) for p in players]
+    await asyncio.gather(*(p.started.wait() for p in players))
+    connect_time = time.perf_counter() - start
+    rooms = clients // 2
+    room_rss = rss_kb(pid)
+
+    start = time.perf_counter()
+    go.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    moves = len(latencies)
+    return {
+        "clients": clients,
+        "rooms": rooms,
+        "plies": plies,
+        "connect_time": connect_time,
+        "play_time": elapsed,
+        "moves": moves,
+        "moves_per_sec": moves / elapsed if elapsed else 0.0,
+        "relay_p50_ms": percentile(latencies, 0.5) * 1000,
+        "relay_p99_ms": percentile(latencies, 0.99) * 1000,
+        "relay_mean_ms": statistics.fmean(latencies) * 1000,
+        "server_rss_kb": room_rss,
+        "rss_per_room_kb": (room_rss - base_rss) / rooms if base_rss and room_rss and rooms else None,
+    }
+
+
+async def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def run(clients=1000, plies=40, connect_batch=200):
+    if clients % 2:
+        raise ValueError("客戶端數量必須是偶數")
+    port = free_port()
+    server = subprocess.Popen([sys.executable, SERVER, "--host", HOST, "--port", str(port), "--records", ""],
+                              stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_port(port))
+        # 探測用的連線會佔到配對位置，等它被清掉再開始
+        time.sleep(0.2)
+        result = asyncio.run(load(port, server.pid, clients, plies, connect_batch))
+    finally:
+        server.terminate()
+        server.wait()
+    result.update({
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": int(time.time()),
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="伺服器壓力測試")
+    parser.add_argument("--clients", type=int, default=1000, help="模擬客戶端數 (兩兩配成一房)")
+    parser.add_argument("--plies", type=int, default=40, help="每局下幾手")
+    parser.add_argument("--connect-batch", type=int, default=200, help="每批同時建立的連線數")
+    parser.add_argument("--out", default="bench_server.json")
+    args = parser.parse_args()
+
+    result = run(args.clients, args.plies, args.connect_batch)
+    print(f"{result['clients']} 客戶端 / {result['rooms']} 房  連線 {result['connect_time']:.2f}s")
+    print(f"{result['moves']} 手 / {result['play_time']:.2f}s = {result['moves_per_sec']:.0f} 手/秒")
+    print(f"轉送延遲 p50 {result['relay_p50_ms']:.2f}ms  p99 {result['relay_p99_ms']:.2f}ms")
+    if result["rss_per_room_kb"] is not None:
+        print(f"每房記憶體約 {result['rss_per_room_kb']:.1f} KB")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"結果已寫入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
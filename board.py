@@ -0,0 +1,187 @@
+""" 五子棋棋盤核心 (不依賴 Tkinter，AI / 伺服器 / 工具共用) """
+import random
+
+# === 參數設定 ===
+BOARD_SIZE = 15
+TIME_LIMIT = 30  # 每回合秒數
+
+EMPTY, BLACK, WHITE = 0, 1, 2
+
+# 四個方向：橫、直、正斜、反斜
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def has_five(mask):
+    """ 位元遮罩中是否有連續五顆 (含長連) """
+    return mask & (mask >> 1) & (mask >> 2) & (mask >> 3) & (mask >> 4) != 0
+
+
+def run_length(mask, pos):
+    """ 回傳 mask 中包含 pos 這一位的連續 1 的 (左端, 右端) 位置 """
+    right = mask >> (pos + 1)
+    hi = pos + ((right ^ (right + 1)).bit_length() - 1)
+    below = ~mask & ((1 << pos) - 1)
+    lo = below.bit_length()
+    return lo, hi
+
+
+_ZOBRIST = {}
+
+
+def zobrist_table(size=BOARD_SIZE):
+    """ 每個 (玩家, 格子) 一個 64 位元亂數；固定種子，棋譜 / 開局庫的雜湊才會跨行程一致 """
+    if size not in _ZOBRIST:
+        rng = random.Random(0x5EED0000 + size)
+        _ZOBRIST[size] = [[rng.getrandbits(64) for _ in range(size * size)] for _ in range(2)]
+    return _ZOBRIST[size]
+
+
+_COL_MASKS = {}
+
+
+def _col_mask(size, start, stop):
+    """ 整盤遮罩中欄 start..stop-1 的位元 """
+    key = (size, start, stop)
+    if key not in _COL_MASKS:
+        row = ((1 << stop) - 1) ^ ((1 << start) - 1)
+        mask = 0
+        for r in range(size):
+            mask |= row << (r * size)
+        _COL_MASKS[key] = mask
+    return _COL_MASKS[key]
+
+
+class Board:
+    """
+    位元壓縮棋盤：每位玩家各有 橫 / 直 / 正斜 / 反斜 的線遮罩，
+    落子與悔棋都是 O(1)，五連判斷只需位移運算。
+    """
+
+    def __init__(self, size=BOARD_SIZE):
+        self.size = size
+        self.cells = bytearray(size * size)
+        n_diag = 2 * size - 1
+        # 索引 0 給黑棋、1 給白棋
+        self.rows = [[0] * size, [0] * size]     # 位元為欄 c
+        self.cols = [[0] * size, [0] * size]     # 位元為列 r
+        self.diags = [[0] * n_diag, [0] * n_diag]  # r - c + size - 1，位元為欄 c
+        self.antis = [[0] * n_diag, [0] * n_diag]  # r + c，位元為欄 c
+        self.stones = [0, 0]                     # 整盤遮罩，位元為 r * size + c
+        self.history = []
+        self.zobrist = zobrist_table(size)
+        self.hash = 0                            # 落子 / 悔棋時增量更新
+
+    # ================= 查詢 =================
+
+    def get(self, r, c):
+        return self.cells[r * self.size + c]
+
+    def is_empty(self, r, c):
+        return self.cells[r * self.size + c] == EMPTY
+
+    def in_bounds(self, r, c):
+        return 0 <= r < self.size and 0 <= c < self.size
+
+    def side_to_move(self):
+        """ 黑棋先手，由手數奇偶決定輪到誰 """
+        return BLACK if len(self.history) % 2 == 0 else WHITE
+
+    def last_move(self):
+        return self.history[-1] if self.history else None
+
+    def is_full(self):
+        return len(self.history) == self.size * self.size
+
+    def empties(self):
+        size = self.size
+        return [(i // size, i % size) for i, v in enumerate(self.cells) if v == EMPTY]
+
+    def candidates(self, radius=2):
+        """ 距離現有棋子 radius 格以內的空點 (用整盤遮罩膨脹，不逐格掃描) """
+        occ = self.stones[0] | self.stones[1]
+        if not occ:
+            center = self.size // 2
+            return [(center, center)]
+        size = self.size
+        full = (1 << (size * size)) - 1
+        near = occ
+        for k in range(1, radius + 1):
+            # 左右平移時要把跨行的位元遮掉
+            near |= (occ << k) & ~_col_mask(size, 0, k) & full
+            near |= (occ >> k) & ~_col_mask(size, size - k, size)
+        horiz = near
+        for k in range(1, radius + 1):
+            near |= (horiz << (k * size)) & full
+            near |= horiz >> (k * size)
+        near &= ~occ
+        moves = []
+        while near:
+            low = near & -near
+            idx = low.bit_length() - 1
+            moves.append((idx // size, idx % size))
+            near ^= low
+        return moves
+
+    def lines_through(self, r, c, player):
+        """ 回傳 (遮罩, 位置) x 4，依 DIRECTIONS 順序 """
+        p = player - 1
+        size = self.size
+        return (
+            (self.rows[p][r], c),
+            (self.cols[p][c], r),
+            (self.diags[p][r - c + size - 1], c),
+            (self.antis[p][r + c], c),
+        )
+
+    # ================= 落子 / 悔棋 =================
+
+    def _toggle(self, r, c, player):
+        p = player - 1
+        size = self.size
+        self.rows[p][r] ^= 1 << c
+        self.cols[p][c] ^= 1 << r
+        self.diags[p][r - c + size - 1] ^= 1 << c
+        self.antis[p][r + c] ^= 1 << c
+        self.stones[p] ^= 1 << (r * size + c)
+        self.hash ^= self.zobrist[p][r * size + c]
+
+    def make(self, r, c, player):
+        self.cells[r * self.size + c] = player
+        self._toggle(r, c, player)
+        self.history.append((r, c))
+
+    def unmake(self):
+        r, c = self.history.pop()
+        idx = r * self.size + c
+        self._toggle(r, c, self.cells[idx])
+        self.cells[idx] = EMPTY
+        return r, c
+
+    def copy(self):
+        other = Board(self.size)
+        for r, c in self.history:
+            other.make(r, c, self.get(r, c))
+        return other
+
+    # ================= 勝負判斷 =================
+
+    def is_win(self, r, c, player):
+        """ 經過 (r, c) 的四條線上是否已連成五子 """
+        for mask, pos in self.lines_through(r, c, player):
+            # 只看以 pos 為中心的 9 格，其中的五連必定經過 (r, c)
+            window = (mask >> (pos - 4) if pos >= 4 else mask << (4 - pos)) & 0x1FF
+            if has_five(window):
+                return True
+        return False
+
+    def win_line(self, r, c, player):
+        """ 若 (r, c) 形成五連，回傳兩端座標 (r1, c1, r2, c2)，否則 None """
+        for (dr, dc), (mask, pos) in zip(DIRECTIONS, self.lines_through(r, c, player)):
+            lo, hi = run_length(mask, pos)
+            if hi - lo < 4:
+                continue
+            # 沿著方向反推回兩端的棋盤座標 (反斜線的位元是欄，方向相反)
+            if dc == -1:
+                return (r - (hi - pos), c + (hi - pos), r + (pos - lo), c - (pos - lo))
+            return (r - (pos - lo) * dr, c - (pos - lo) * dc, r + (hi - pos) * dr, c + (hi - pos) * dc)
+        return None
@@ -0,0 +1,154 @@
+""" 開局庫：以 8 種對稱取最小雜湊為鍵，排序後的二進位檔用 mmap 直接二分搜尋，不需載入 """
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from board import Board, BOARD_SIZE, zobrist_table
+
+MAGIC = b"GMKBOOK1"
+HEADER = struct.Struct("<8sIHH")   # magic, 筆數, 每筆長度, 棋盤大小
+RECORD = struct.Struct("<QHh")     # 標準化雜湊, 標準化座標 r * size + c, 分數
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening.book")
+
+
+# ================= 對稱 =================
+
+def _transforms(size):
+    n = size - 1
+    return [
+        lambda r, c: (r, c),
+        lambda r, c: (c, n - r),        # 旋轉 90
+        lambda r, c: (n - r, n - c),    # 旋轉 180
+        lambda r, c: (n - c, r),        # 旋轉 270
+        lambda r, c: (r, n - c),        # 左右鏡射
+        lambda r, c: (n - r, c),        # 上下鏡射
+        lambda r, c: (c, r),            # 主對角線鏡射
+        lambda r, c: (n - c, n - r),    # 反對角線鏡射
+    ]
+
+
+# 每個變換的反變換編號
+_INVERSE = [0, 3, 2, 1, 4, 5, 6, 7]
+
+
+def canonical(board):
+    """ 回傳 (標準化雜湊, 使用的變換編號)；同一局面的 8 種對稱得到同一個鍵 """
+    size = board.size
+    table = zobrist_table(size)
+    best = None
+    for t, f in enumerate(_transforms(size)):
+        h = 0
+        for r, c in board.history:
+            tr, tc = f(r, c)
+            h ^= table[board.get(r, c) - 1][tr * size + tc]
+        if best is None or h < best[0]:
+            best = (h, t)
+    return best
+
+
+# ================= 查詢 =================
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_PATH):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, record_size, self.size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"不是開局庫檔案: {path}")
+        self.transforms = _transforms(self.size)
+
+    @classmethod
+    def open_default(cls):
+        """ 預設檔案不存在就回傳 None (開局庫是選用的) """
+        return cls() if os.path.exists(DEFAULT_PATH) else None
+
+    def _key_at(self, i):
+        return struct.unpack_from("<Q", self.mm, HEADER.size + i * RECORD.size)[0]
+
+    def lookup(self, board):
+        """ 回傳開局庫中的著法 (r, c)，查不到回傳 None """
+        if board.size != self.size:
+            return None
+        key, t = canonical(board)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        k, idx, _ = RECORD.unpack_from(self.mm, HEADER.size + lo * RECORD.size)
+        if k != key:
+            return None
+        # 存的是標準化後的座標，轉回目前棋盤的方向
+        return self.transforms[_INVERSE[t]](*divmod(idx, self.size))
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+# ================= 離線建置 =================
+
+def build(path, plies=4, branch=3, depth=4, level="Hard", time_limit=30.0, log=print):
+    """
+    從空棋盤開始自我對弈展開：每個局面用深度 depth 搜出最佳著法寫入開局庫，
+    並沿著最佳著法與啟發分數前 branch 名的著法繼續展開，直到 plies 手。
+    """
+    from engine import Engine
+
+    engine = Engine(level)
+    entries = {}
+    frontier = [[]]
+    start = time.perf_counter()
+    for ply in range(plies):
+        next_frontier = []
+        for moves in frontier:
+            board = Board()
+            for r, c in moves:
+                board.make(r, c, board.side_to_move())
+            key, t = canonical(board)
+            if key in entries:
+                continue
+            player = board.side_to_move()
+            engine.tt.new_search()
+            score, move = engine.analyse(board, player, max_depth=depth, time_limit=time_limit)
+            cr, cc = _transforms(board.size)[t](*move)
+            entries[key] = (cr * board.size + cc, max(-32768, min(32767, score)))
+            for child in dict.fromkeys([move] + engine.ordered_moves(board, player, branch)):
+                next_frontier.append(moves + [child])
+        log(f"第 {ply + 1} 手: 累計 {len(entries)} 個局面 ({time.perf_counter() - start:.1f}s)")
+        frontier = next_frontier
+    write(path, entries)
+    return len(entries)
+
+
+def write(path, entries, size=BOARD_SIZE):
+    """ entries: {標準化雜湊: (標準化座標, 分數)}，依雜湊排序後寫出 """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries), RECORD.size, size))
+        for key in sorted(entries):
+            idx, score = entries[key]
+            f.write(RECORD.pack(key, idx, score))
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="建立五子棋開局庫")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--plies", type=int, default=4, help="展開到第幾手")
+    parser.add_argument("--branch", type=int, default=3, help="每個局面額外展開幾個候選著法")
+    parser.add_argument("--depth", type=int, default=4, help="每個局面的搜尋深度")
+    parser.add_argument("--level", default="Hard")
+    args = parser.parse_args()
+    n = build(args.out, args.plies, args.branch, args.depth, args.level)
+    print(f"已寫入 {n} 筆到 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+""" 五子棋 AI 引擎：negamax alpha-beta + 迭代加深，每步有時間上限 """
+import random
+import time
+from board import TIME_LIMIT, run_length
+from book import OpeningBook
+from evaluator import PatternEvaluator
+from metrics import REGISTRY, profiled
+from threats import find_vcf, find_vct
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+
+WIN_SCORE = 1000000
+INF = WIN_SCORE * 2
+MATE_BOUND = WIN_SCORE - 1000  # 超過這個值表示已算出勝負，存入置換表時要換算步數
+
+# 難度 => 搜尋深度 / 每步秒數 / 防守權重 / 隨機落子機率 / 每層展開的候選數 / VCF、VCT 節點上限 / 是否查開局庫
+LEVELS = {
+    "Easy":   {"depth": 1, "time": 0.3, "defense": 0.5, "random": 0.3, "width": 8, "vcf": 0, "vct": 0, "book": False},
+    "Normal": {"depth": 3, "time": 1.5, "defense": 1.2, "random": 0.0, "width": 10, "vcf": 1000, "vct": 0, "book": True},
+    "Hard":   {"depth": 12, "time": TIME_LIMIT / 6, "defense": 2.0, "random": 0.0, "width": 12, "vcf": 5000, "vct": 2000, "book": True},
+}
+
+# 連續長度 => 分數 (與原本 check_line_strength 相同)
+STRENGTH = {2: 10, 3: 100, 4: 1000}
+
+
+class SearchTimeout(Exception):
+    """ 時間到，中止這一輪迭代 """
+
+
+# ================= 啟發函式 =================
+
+def line_strength(board, r, c, player):
+    """ 假設 player 下在 (r, c)，四個方向的連子強度總和 """
+    score = 0
+    for mask, pos in board.lines_through(r, c, player):
+        lo, hi = run_length(mask | (1 << pos), pos)
+        count = hi - lo + 1
+        if count >= 5: score += 10000
+        else: score += STRENGTH.get(count, 0)
+    return score
+
+
+def cell_score(board, r, c, player, defense_weight):
+    """ 進攻分 + 防守分 x 權重 (原本的 evaluate) """
+    atk = line_strength(board, r, c, player)
+    dfs = line_strength(board, r, c, 3 - player)
+    return atk + dfs * defense_weight
+
+
+# ================= 搜尋引擎 =================
+
+def _to_tt(score, ply):
+    """ 勝負分數改成「距離此局面」的步數再存 """
+    if score >= MATE_BOUND: return score + ply
+    if score <= -MATE_BOUND: return score - ply
+    return score
+
+
+def _from_tt(score, ply):
+    if score >= MATE_BOUND: return score - ply
+    if score <= -MATE_BOUND: return score + ply
+    return score
+
+
+class Engine:
+    def __init__(self, level="Normal", seed=None, tt_mb=16):
+        self.rng = random.Random(seed)
+        self.set_level(level)
+        self.nodes = 0
+        self.depth_reached = 0
+        self.best_at = 0.0
+        self.full_root = True
+        self.stats = {}  # 上一次 search 的統計
+        self.stop = None
+        # 置換表在整盤棋中保留，下一步可以沿用上一步的搜尋結果
+        self.tt = TranspositionTable(tt_mb)
+        self.book = OpeningBook.open_default()
+
+    def set_level(self, level):
+        cfg = LEVELS[level]
+        self.level = level
+        self.max_depth = cfg["depth"]
+        self.time_limit = cfg["time"]
+        self.defense_weight = cfg["defense"]
+        self.random_rate = cfg["random"]
+        self.width = cfg["width"]
+        self.vcf_nodes = cfg["vcf"]
+        self.vct_nodes = cfg["vct"]
+        self.use_book = cfg["book"]
+
+    def ordered_moves(self, board, player, limit=None, first=None):
+        """ 以進攻 / 防守啟發分數排序候選點；first (置換表著法) 一律排第一 """
+        scored = [(cell_score(board, r, c, player, self.defense_weight), (r, c))
+                  for r, c in board.candidates()]
+        scored.sort(reverse=True)
+        moves = [m for _, m in scored]
+        if limit:
+            moves = moves[:limit]
+        if first is not None:
+            if first in moves:
+                moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _tt_move(self, entry):
+        if entry is None or entry[3] == NO_MOVE:
+            return None
+        r, c = divmod(entry[3], self.board.size)
+        return (r, c) if self.board.is_empty(r, c) else None
+
+    @profiled
+    def search(self, board, player, max_depth=None, time_limit=None, stop=None):
+        """
+        回傳 player 的最佳落子 (r, c)；棋盤已滿則回傳 None。
+        stop 為 threading.Event，被設定時和時間到一樣提前結束。
+        統計 (節點數、nps、深度、置換表命中率、找到最終著法的時間) 留在 self.stats。
+        """
+        start = time.perf_counter()
+        probes, hits = self.tt.probes, self.tt.hits
+        self.nodes = self.depth_reached = 0
+        self.best_at = start
+        source, move = self._select(board, player, max_depth, time_limit, stop)
+        elapsed = time.perf_counter() - start
+        probes = self.tt.probes - probes
+        self.stats = {
+            "source": source,
+            "move": move,
+            "nodes": self.nodes,
+            "time": elapsed,
+            "nps": self.nodes / elapsed if elapsed else 0.0,
+            "depth": self.depth_reached,
+            "tt_hit_rate": (self.tt.hits - hits) / probes if probes else 0.0,
+            "first_best_time": (self.best_at if source == "search" else time.perf_counter()) - start,
+        }
+        REGISTRY.counter("engine_searches_total").inc()
+        REGISTRY.counter("engine_nodes_total").inc(self.nodes)
+        REGISTRY.histogram("engine_search_seconds").observe(elapsed)
+        return move
+
+    def _select(self, board, player, max_depth, time_limit, stop):
+        """ 回傳 (著法來源, 著法) """
+        if board.is_full():
+            return "full", None
+        if self.random_rate and self.rng.random() < self.random_rate:
+            return "random", self.rng.choice(board.empties())
+        if self.use_book and self.book:
+            move = self.book.lookup(board)
+            if move and board.is_empty(*move):
+                return "book", move
+        line = self.forced_win(board, player)
+        if line:
+            return "threat", line[0]
+        self.tt.new_search()
+        return "search", self.analyse(board, player, None, max_depth, time_limit, stop)[1]
+
+    def forced_win(self, board, player):
+        """ 正式搜尋前先找只用逼著的必勝手順 (VCF，困難再加 VCT)，找到就照著下 """
+        line = None
+        if self.vcf_nodes:
+            line = find_vcf(board, player, self.vcf_nodes)
+        if line is None and self.vct_nodes:
+            line = find_vct(board, player, self.vct_nodes)
+        return line
+
+    def analyse(self, board, player, root_moves=None, max_depth=None, time_limit=None, stop=None):
+        """
+        迭代加深搜尋，回傳 (分數, 著法)。root_moves 可指定只搜哪些根節點著法
+        (平行搜尋時每個行程各分一部分)；不指定則用排序後的候選點。
+        """
+        self.board = board.copy()
+        self.evaluator = PatternEvaluator(self.board)
+        self.nodes = 0
+        self.depth_reached = 0
+        max_depth = max_depth or self.max_depth
+        time_limit = self.time_limit if time_limit is None else time_limit
+        self.deadline = time.perf_counter() + time_limit
+        self.stop = stop
+
+        # 只搜一部分根節點著法時，結果只是這一部分的最佳值，不能當成整個局面的分數存進置換表
+        self.full_root = root_moves is None
+        if root_moves is None:
+            first = self._tt_move(self.tt.probe(self.board.hash))
+            root_moves = self.ordered_moves(self.board, player, self.width * 2, first)
+        else:
+            root_moves = list(root_moves)
+        best_score, best_move = -INF, root_moves[0]
+        self.best_at = time.perf_counter()
+        for depth in range(1, max_depth + 1):
+            self._partial = None
+            try:
+                score, move = self._search_root(root_moves, player, depth)
+            except SearchTimeout:
+                # 上一輪最佳著法一定最先搜完，這一輪已搜過的部分只會更好
+                if self._partial:
+                    if self._partial[1] != best_move:
+                        self.best_at = time.perf_counter()
+                    best_score, best_move = self._partial
+                break
+            if move != best_move:
+                self.best_at = time.perf_counter()
+            best_score, best_move = score, move
+            self.depth_reached = depth
+            # 找到必勝 / 必敗就不用再加深
+            if abs(score) >= WIN_SCORE - 100:
+                break
+            # 上一輪的最佳著法排到最前面，讓下一輪更快剪枝
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+        return best_score, best_move
+
+    def _check_time(self):
+        if time.perf_counter() > self.deadline or (self.stop is not None and self.stop.is_set()):
+            raise SearchTimeout()
+
+    def _search_root(self, moves, player, depth):
+        board, ev = self.board, self.evaluator
+        alpha, beta = -INF, INF
+        best_move = moves[0]
+        for r, c in moves:
+            ev.make(r, c, player)
+            try:
+                if board.is_win(r, c, player):
+                    score = WIN_SCORE
+                else:
+                    score = -self._negamax(depth - 1, -beta, -alpha, 3 - player, 1)
+            finally:
+                ev.unmake()
+            if score > alpha:
+                alpha, best_move = score, (r, c)
+                self._partial = (alpha, best_move)
+        if self.full_root:
+            self.tt.store(board.hash, alpha, depth, EXACT, best_move[0] * board.size + best_move[1])
+        return alpha, best_move
+
+    def _negamax(self, depth, alpha, beta, player, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self._check_time()
+        board, ev = self.board, self.evaluator
+        if depth == 0:
+            return ev.evaluate(player)
+
+        alpha_orig = alpha
+        entry = self.tt.probe(board.hash)
+        if entry is not None and entry[1] >= depth:
+            score, flag = _from_tt(entry[0], ply), entry[2]
+            if flag == EXACT:
+                return score
+            if flag == LOWER and score > alpha:
+                alpha = score
+            elif flag == UPPER and score < beta:
+                beta = score
+            if alpha >= beta:
+                return score
+
+        moves = self.ordered_moves(board, player, self.width, self._tt_move(entry))
+        if not moves:
+            return 0
+        best, best_move = -INF, moves[0]
+        for r, c in moves:
+            ev.make(r, c, player)
+            try:
+                if board.is_win(r, c, player):
+                    score = WIN_SCORE - ply
+                else:
+                    score = -self._negamax(depth - 1, -beta, -alpha, 3 - player, ply + 1)
+            finally:
+                ev.unmake()
+            if score > best:
+                best, best_move = score, (r, c)
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig: flag = UPPER
+        elif best >= beta: flag = LOWER
+        else: flag = EXACT
+        self.tt.store(board.hash, _to_tt(best, ply), depth, flag, best_move[0] * board.size + best_move[1])
+        return best
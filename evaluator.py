@@ -0,0 +1,132 @@
+""" 增量棋型評估：每條線編成 base-4 整數，6 格視窗直接查預先算好的棋型分數表 """
+from board import BOARD_SIZE, BLACK, WHITE, EMPTY
+
+BORDER = 3  # 線的兩端補一格邊界，當作誰都不能用的格子
+WINDOW = 6
+WINDOW_MASK = (1 << (2 * WINDOW)) - 1
+
+# 棋型分數
+FIVE = 100000
+OPEN_FOUR = 20000
+FOUR = 2000
+OPEN_THREE = 2000
+THREE = 200
+OPEN_TWO = 200
+TWO = 20
+ONE = 1
+
+
+def _classify(w, p):
+    """ 6 格視窗 w 對玩家 p 而言最強的棋型分數 """
+    subs = (w[0:5], w[1:6])
+    if any(all(x == p for x in sub) for sub in subs):
+        return FIVE
+    inner = w[1:5]
+    open_ends = w[0] == EMPTY and w[5] == EMPTY
+    if open_ends and inner.count(p) == 4:
+        return OPEN_FOUR
+    best = 0
+    for sub in subs:
+        if sub.count(p) + sub.count(EMPTY) != 5:
+            continue  # 這五格裡有對手或邊界，不可能連成五
+        best = max(best, {4: FOUR, 3: THREE, 2: TWO, 1: ONE}.get(sub.count(p), 0))
+    if open_ends and inner.count(EMPTY) + inner.count(p) == 4:
+        if inner.count(p) == 3:
+            best = max(best, OPEN_THREE)
+        elif inner.count(p) == 2:
+            best = max(best, OPEN_TWO)
+    return best
+
+
+def _build_table():
+    """ 4^6 種視窗 => 黑棋分數 - 白棋分數 """
+    table = [0] * (1 << (2 * WINDOW))
+    for code in range(len(table)):
+        w = [(code >> (2 * i)) & 3 for i in range(WINDOW)]
+        table[code] = _classify(w, BLACK) - _classify(w, WHITE)
+    return table
+
+
+PATTERN_TABLE = _build_table()
+
+
+def _build_lines(size):
+    """
+    回傳 (各線長度, 每格經過的線)；只收長度 >= 5 的線。
+    每格對應 [(線編號, 在線上 code 的位移), ...]，位移已算進左端邊界。
+    """
+    lengths = []
+    cell_lines = [[] for _ in range(size * size)]
+
+    def add_line(cells):
+        if len(cells) < 5:
+            return
+        line = len(lengths)
+        lengths.append(len(cells))
+        for i, (r, c) in enumerate(cells):
+            cell_lines[r * size + c].append((line, 2 * (i + 1)))
+
+    for r in range(size):
+        add_line([(r, c) for c in range(size)])
+    for c in range(size):
+        add_line([(r, c) for r in range(size)])
+    for k in range(-(size - 1), size):  # r - c = k
+        add_line([(c + k, c) for c in range(size) if 0 <= c + k < size])
+    for a in range(2 * size - 1):  # r + c = a，沿 (1, -1) 方向
+        add_line([(r, a - r) for r in range(size) if 0 <= a - r < size])
+    return lengths, cell_lines
+
+
+_LINES = {BOARD_SIZE: _build_lines(BOARD_SIZE)}
+
+
+class PatternEvaluator:
+    """
+    包住一個 Board，落子 / 悔棋時只重算經過該點的四條線上受影響的視窗，
+    整盤分數隨時可用 evaluate() 取得。
+    """
+
+    def __init__(self, board):
+        self.board = board
+        if board.size not in _LINES:
+            _LINES[board.size] = _build_lines(board.size)
+        lengths, self.cell_lines = _LINES[board.size]
+        self.codes = []
+        for n in lengths:
+            # 兩端邊界都設為 BORDER，中間全空
+            self.codes.append(BORDER | (BORDER << (2 * (n + 1))))
+        self.n_windows = [n + 2 - WINDOW + 1 for n in lengths]
+        self.total = 0
+        for line, code in enumerate(self.codes):
+            self.total += sum(PATTERN_TABLE[(code >> (2 * j)) & WINDOW_MASK] for j in range(self.n_windows[line]))
+        for r, c in board.history:
+            self._update(r, c, board.get(r, c))
+
+    def _update(self, r, c, delta):
+        codes, n_windows, table = self.codes, self.n_windows, PATTERN_TABLE
+        total = self.total
+        for line, shift in self.cell_lines[r * self.board.size + c]:
+            old = codes[line]
+            new = old + (delta << shift)
+            codes[line] = new
+            # 只有包含這一格的視窗會變
+            k = shift >> 1
+            for j in range(max(0, k - WINDOW + 1), min(n_windows[line] - 1, k) + 1):
+                s = 2 * j
+                total += table[(new >> s) & WINDOW_MASK] - table[(old >> s) & WINDOW_MASK]
+        self.total = total
+
+    def make(self, r, c, player):
+        self.board.make(r, c, player)
+        self._update(r, c, player)
+
+    def unmake(self):
+        r, c = self.board.history[-1]
+        player = self.board.get(r, c)
+        self.board.unmake()
+        self._update(r, c, -player)
+        return r, c
+
+    def evaluate(self, player):
+        """ 從 player 角度的整盤分數 """
+        return self.total if player == BLACK else -self.total
@@ -1,15 +1,220 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, scrolledtext
+import os
+import queue
 import socket
 import threading
 import random
 import math
+from board import Board, BOARD_SIZE, TIME_LIMIT
+from engine import Engine
+from ai_worker import AIWorker
+import protocol
+import records
+import metrics
 
 # === 參數設定 ===
-BOARD_SIZE = 15
-CELL_SIZE = 40
-OFFSET = 30
-TIME_LIMIT = 30  # 每回合秒數
+MARGIN = 0.75      # 棋盤四周留白 (以格寬為單位)，格寬依視窗大小計算
+RESIZE_DELAY = 50  # 視窗拖動停止多久 (ms) 後才重新排版
+STAR_POINTS = [(3, 3), (3, 11), (7, 7), (11, 3), (11, 11)]
+FRAME_MS = 30      # 特效每幀間隔
+MAX_SPARKS = 240   # 煙火粒子上限 (同時最多約 12 朵)
+MAX_DROPS = 150    # 雨滴上限
+FIREWORK_COLORS = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF', '#00FFFF', '#FFFFFF']
+
+class BoardView:
+    """ 棋盤繪製：格線只建一次，每手只新增 / 刪除一顆棋子，縮放時只搬動既有圖形的座標 """
+
+    def __init__(self, canvas, size=BOARD_SIZE):
+        self.canvas = canvas
+        self.size = size
+        self.cell = 1.0
+        self.ox = self.oy = 0.0
+        self.stones = {}        # (r, c) => (圖形 id, 顏色)
+        self.last = None        # 最後一手標記目前的位置
+        self.win_item = None
+        self.win_info = None
+        self.resize_job = None
+        self.h_lines = [canvas.create_line(0, 0, 0, 0, tags="grid") for _ in range(size)]
+        self.v_lines = [canvas.create_line(0, 0, 0, 0, tags="grid") for _ in range(size)]
+        self.stars = [canvas.create_oval(0, 0, 0, 0, fill="black", tags="grid") for _ in STAR_POINTS]
+        self.marker = canvas.create_oval(0, 0, 0, 0, fill="red", outline="red", state="hidden")
+        self.layout(int(canvas["width"]), int(canvas["height"]))
+
+    def center(self, r, c):
+        return self.ox + c * self.cell, self.oy + r * self.cell
+
+    def cell_at(self, x, y):
+        """ 畫面座標 => 最近的交叉點 (可能在棋盤外) """
+        c = math.floor((x - self.ox) / self.cell + 0.5)
+        r = math.floor((y - self.oy) / self.cell + 0.5)
+        return r, c
+
+    def _place(self, item, r, c, radius):
+        cx, cy = self.center(r, c)
+        self.canvas.coords(item, cx - radius, cy - radius, cx + radius, cy + radius)
+
+    def _stone_radius(self):
+        return self.cell * 0.4
+
+    def _dot_radius(self):
+        return max(2, self.cell * 0.075)
+
+    def schedule_layout(self, width, height):
+        """ <Configure> 拖動時會連續觸發，只在停下來後排版一次 """
+        if self.resize_job:
+            self.canvas.after_cancel(self.resize_job)
+        self.resize_job = self.canvas.after(RESIZE_DELAY, self.layout, width, height)
+
+    def layout(self, width, height):
+        self.resize_job = None
+        n = self.size
+        self.cell = max(4.0, min(width, height) / (n - 1 + 2 * MARGIN))
+        span = (n - 1) * self.cell
+        self.ox, self.oy = (width - span) / 2, (height - span) / 2
+        coords = self.canvas.coords
+        for i in range(n):
+            coords(self.h_lines[i], self.ox, self.oy + i * self.cell, self.ox + span, self.oy + i * self.cell)
+            coords(self.v_lines[i], self.ox + i * self.cell, self.oy, self.ox + i * self.cell, self.oy + span)
+        for item, (r, c) in zip(self.stars, STAR_POINTS):
+            self._place(item, r, c, self._dot_radius())
+        for (r, c), (item, _) in self.stones.items():
+            self._place(item, r, c, self._stone_radius())
+        if self.last:
+            self._place(self.marker, *self.last, self._dot_radius())
+        if self.win_info:
+            self._place_win_line()
+
+    def sync(self, board):
+        """ 只處理和畫面不同的棋子：下一手 / 悔棋只動一兩顆，換棋譜或重開才會多 """
+        want = {(r, c): board.get(r, c) for r, c in board.history}
+        for pos, (item, color) in list(self.stones.items()):
+            if want.get(pos) != color:
+                self.canvas.delete(item)
+                del self.stones[pos]
+        radius = self._stone_radius()
+        for (r, c), color in want.items():
+            if (r, c) not in self.stones:
+                cx, cy = self.center(r, c)
+                item = self.canvas.create_oval(cx - radius, cy - radius, cx + radius, cy + radius,
+                                               fill="black" if color == 1 else "white", tags="stone")
+                self.stones[(r, c)] = (item, color)
+        self.last = board.last_move()
+        if self.last:
+            self._place(self.marker, *self.last, self._dot_radius())
+            self.canvas.itemconfig(self.marker, state="normal")
+            self.canvas.tag_raise(self.marker, "stone")
+        else:
+            self.canvas.itemconfig(self.marker, state="hidden")
+
+    def draw_win_line(self, win_info):
+        self.win_info = win_info
+        self.win_item = self.canvas.create_line(0, 0, 0, 0, fill="red", width=5, tags="effect")
+        self._place_win_line()
+
+    def _place_win_line(self):
+        r1, c1, r2, c2 = self.win_info
+        self.canvas.coords(self.win_item, *self.center(r1, c1), *self.center(r2, c2))
+
+    def clear_win_line(self):
+        self.win_info = self.win_item = None
+
+class EffectEngine:
+    """
+    煙火 / 下雨特效：粒子圖形一開始就建好重複使用 (coords 搬位置、state 隱藏)，
+    整個特效只有一個每幀的 after 迴圈，數量有上限，不會越跑越多。
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.sparks = [canvas.create_oval(0, 0, 0, 0, state="hidden", tags="fx") for _ in range(MAX_SPARKS)]
+        self.drops = [canvas.create_line(0, 0, 0, 0, fill="#708090", width=1, state="hidden", tags="fx")
+                      for _ in range(MAX_DROPS)]
+        self.free_sparks = list(self.sparks)
+        self.free_drops = list(self.drops)
+        self.active = []  # [圖形 id, x, y, dx, dy, 剩餘幀數]；雨滴的 dx 放長度
+        self.mode = None
+        self.job = None
+        self.next_burst = 0
+
+    @property
+    def running(self):
+        return self.mode is not None
+
+    def start(self, mode):
+        """ mode 為 "fireworks" 或 "rain" """
+        self.stop()
+        self.mode = mode
+        self.next_burst = 0
+        self.canvas.tag_raise("fx")  # 蓋在棋子上面
+        self.job = self.canvas.after(FRAME_MS, self.tick)
+
+    def stop(self):
+        """ 取消迴圈、一次隱藏整個池子；不用逐一刪除圖形 """
+        if self.job:
+            self.canvas.after_cancel(self.job)
+            self.job = None
+        if self.active:
+            self.canvas.itemconfig("fx", state="hidden")
+        self.mode = None
+        self.active = []
+        self.free_sparks = list(self.sparks)
+        self.free_drops = list(self.drops)
+
+    def burst(self, width, height):
+        cx = random.randint(50, max(50, width - 50))
+        cy = random.randint(50, max(50, height - 50))
+        color = random.choice(FIREWORK_COLORS)
+        for _ in range(min(20, len(self.free_sparks))):
+            item = self.free_sparks.pop()
+            angle = random.uniform(0, 2 * math.pi)
+            speed = random.uniform(2, 6)
+            self.canvas.itemconfig(item, fill=color, outline=color, state="normal")
+            self.active.append([item, cx, cy, math.cos(angle) * speed, math.sin(angle) * speed, 20])
+
+    def drop(self, width):
+        if not self.free_drops: return
+        item = self.free_drops.pop()
+        self.canvas.itemconfig(item, state="normal")
+        self.active.append([item, random.randint(0, width), -10, random.randint(10, 20), random.randint(10, 20), -1])
+
+    def tick(self):
+        self.job = self.canvas.after(FRAME_MS, self.tick)
+        canvas = self.canvas
+        if not canvas.winfo_viewable(): return  # 視窗縮小或切到其他畫面時暫停
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if self.mode == "fireworks":
+            self.next_burst -= FRAME_MS
+            if self.next_burst <= 0:
+                self.burst(width, height)
+                self.next_burst = random.randint(300, 800)
+        else:
+            self.drop(width)
+
+        alive = []
+        for p in self.active:
+            item, x, y, dx, dy, life = p
+            if life < 0:
+                # 雨滴：dx 是長度，dy 是速度
+                y += dy
+                if y > height:
+                    canvas.itemconfig(item, state="hidden")
+                    self.free_drops.append(item)
+                    continue
+                canvas.coords(item, x, y, x, y + dx)
+            else:
+                life -= 1
+                if life <= 0:
+                    canvas.itemconfig(item, state="hidden")
+                    self.free_sparks.append(item)
+                    continue
+                x += dx
+                y += dy + 0.1  # 加一點重力
+                canvas.coords(item, x - 2, y - 2, x + 2, y + 2)
+                p[5] = life
+            p[1], p[2] = x, y
+            alive.append(p)
+        self.active = alive
 
 class GomokuApp:
     def __init__(self, root):
@@ -18,8 +223,8 @@ class GomokuApp:
         self.root.geometry("950x700") 
 
         # === 遊戲狀態 ===
-        self.board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
-        self.history = []
+        self.board = Board()
+        self.history = self.board.history
         self.current_player = 1 # 1:黑, 2:白
         self.my_color = 1       # 單機預設為黑
         self.player_name = "玩家" # 預設暱稱
@@ -27,8 +232,17 @@ class GomokuApp:
         self.mode = "PVE"       
         self.difficulty = "Normal"
         self.timer_seconds = TIME_LIMIT
+        self.timer_job = None   # 目前的倒數排程，換手時先取消，避免疊好幾條倒數
         self.socket = None
-        self.effect_running = False # 控制特效開關
+        self.writer = None
+        self.flush_job = None   # 排好的 after_idle flush
+        self.net_frames = None  # 接收執行緒解出的封包，由主迴圈 poll_network 取出處理
+        self.net_job = None
+        self.engine = Engine(self.difficulty)
+        self.ai = AIWorker(self.engine) # AI 在背景執行緒思考，不卡住介面
+        self.records = records.GameStore()
+        self.replay = None      # 回放中的棋譜
+        self.replay_index = 0
         
         # === 建立三個主要介面 ===
         self.create_main_menu()       
@@ -48,6 +262,8 @@ class GomokuApp:
         
         tk.Button(self.menu_frame, text="單機挑戰 (PVE)", command=self.go_to_difficulty_select, **btn_style, bg="#444444", fg="white").pack(pady=10)
         tk.Button(self.menu_frame, text="線上對戰 (Online)", command=self.setup_online, **btn_style, bg="#444444", fg="white").pack(pady=10)
+        tk.Button(self.menu_frame, text="觀戰 (Watch)", command=lambda: self.setup_online(watch=True), **btn_style, bg="#444444", fg="white").pack(pady=10)
+        tk.Button(self.menu_frame, text="棋譜回放 (Replay)", command=self.start_replay, **btn_style, bg="#444444", fg="white").pack(pady=10)
         tk.Button(self.menu_frame, text="離開遊戲", command=self.root.quit, **btn_style, bg="#cc0000", fg="white").pack(pady=10)
 
     def create_difficulty_menu(self):
@@ -69,6 +285,8 @@ class GomokuApp:
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.canvas.bind("<Button-1>", self.on_click)
         self.canvas.bind("<Configure>", self.on_resize)
+        self.view = BoardView(self.canvas)
+        self.effects = EffectEngine(self.canvas)
         
         # 右側：面板
         self.info_panel = tk.Frame(self.game_frame, width=300, bg="#dddddd")
@@ -83,7 +301,20 @@ class GomokuApp:
         self.lbl_diff_display = tk.Label(self.info_panel, text="", font=("微軟正黑體", 12), fg="blue", bg="#dddddd")
         self.lbl_diff_display.pack(pady=5)
         
-        tk.Button(self.info_panel, text="悔棋 (Undo)", command=self.undo_move).pack(fill=tk.X, padx=10, pady=5)
+        # AI 上一手的搜尋統計
+        self.lbl_stats = tk.Label(self.info_panel, text="", font=("Consolas", 9), fg="#555555", bg="#dddddd", justify=tk.LEFT)
+        self.lbl_stats.pack(pady=2)
+        
+        # 回放模式才顯示的控制列
+        self.replay_bar = tk.Frame(self.info_panel, bg="#dddddd")
+        tk.Button(self.replay_bar, text="<< 上一局", command=lambda: self.load_replay(self.replay_index - 1)).grid(row=0, column=0, sticky="ew")
+        tk.Button(self.replay_bar, text="下一局 >>", command=lambda: self.load_replay(self.replay_index + 1)).grid(row=0, column=1, sticky="ew")
+        tk.Button(self.replay_bar, text="< 上一步", command=lambda: self.replay_step(-1)).grid(row=1, column=0, sticky="ew")
+        tk.Button(self.replay_bar, text="下一步 >", command=lambda: self.replay_step(1)).grid(row=1, column=1, sticky="ew")
+        self.replay_bar.columnconfigure((0, 1), weight=1)
+        
+        self.btn_undo = tk.Button(self.info_panel, text="悔棋 (Undo)", command=self.undo_move)
+        self.btn_undo.pack(fill=tk.X, padx=10, pady=5)
         tk.Button(self.info_panel, text="回到主選單", command=self.back_to_menu).pack(fill=tk.X, padx=10, pady=5)
         
         tk.Label(self.info_panel, text="--- 聊天室 ---", bg="#dddddd").pack(pady=(20, 5))
@@ -114,84 +345,18 @@ class GomokuApp:
     def start_fireworks(self):
         """ 勝利煙火特效 """
         if not self.game_over: return
-        self.effect_running = True
-        
-        colors = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF', '#00FFFF', '#FFFFFF']
-        
-        def create_explosion():
-            if not self.effect_running: return
-            # 隨機中心點
-            cx = random.randint(50, 600)
-            cy = random.randint(50, 600)
-            color = random.choice(colors)
-            
-            # 產生多個粒子
-            for _ in range(20):
-                angle = random.uniform(0, 2 * math.pi)
-                speed = random.uniform(2, 6)
-                dx = math.cos(angle) * speed
-                dy = math.sin(angle) * speed
-                self.animate_particle(cx, cy, dx, dy, color, 20)
-            
-            # 隨機時間後產生下一個煙火
-            self.root.after(random.randint(300, 800), create_explosion)
-
-        create_explosion()
-
-    def animate_particle(self, x, y, dx, dy, color, life):
-        """ 移動單個煙火粒子 """
-        if life <= 0 or not self.effect_running: return
-        
-        # 畫粒子
-        item = self.canvas.create_oval(x-2, y-2, x+2, y+2, fill=color, outline=color, tags="effect")
-        
-        # 下一幀的位置
-        new_x = x + dx
-        new_y = y + dy + 0.1 # 加一點重力
-        
-        # 50ms 後更新
-        self.root.after(50, lambda: self.update_particle(item, new_x, new_y, dx, dy, color, life-1))
-
-    def update_particle(self, item, x, y, dx, dy, color, life):
-        self.canvas.delete(item) # 清除上一幀
-        self.animate_particle(x, y, dx, dy, color, life)
+        self.effects.start("fireworks")
 
     def start_rain(self):
         """ 失敗下雨特效 """
         if not self.game_over: return
-        self.effect_running = True
-        
-        def create_rain():
-            if not self.effect_running: return
-            
-            # 產生雨滴
-            x = random.randint(0, 650)
-            y = -10
-            length = random.randint(10, 20)
-            speed = random.randint(10, 20)
-            
-            self.animate_raindrop(x, y, length, speed)
-            
-            # 密集產生
-            self.root.after(20, create_rain)
-            
-        create_rain()
-
-    def animate_raindrop(self, x, y, length, speed):
-        if y > 700 or not self.effect_running: return # 超出畫面就停止
-        
-        item = self.canvas.create_line(x, y, x, y+length, fill="#708090", width=1, tags="effect")
-        
-        self.root.after(30, lambda: self.update_raindrop(item, x, y+speed, length, speed))
-
-    def update_raindrop(self, item, x, y, length, speed):
-        self.canvas.delete(item)
-        self.animate_raindrop(x, y, length, speed)
+        self.effects.start("rain")
 
     def clear_effects(self):
         """ 清除所有特效 """
-        self.effect_running = False
-        self.canvas.delete("effect") # 刪除所有標籤為 effect 的圖形
+        self.effects.stop()
+        self.canvas.delete("effect") # 刪除勝利連線
+        self.view.clear_win_line()
 
     # ================= 遊戲邏輯 =================
 
@@ -211,30 +376,50 @@ class GomokuApp:
     def start_pve(self, level):
         self.mode = "PVE"
         self.difficulty = level
+        self.ai.cancel()
+        self.engine.set_level(level)
         self.lbl_diff_display.config(text=f"玩家: {self.player_name} | 難度: {level}")
         self.show_frame("GAME")
         self.start_timer()
+        self.ai.ponder(self.board, 1) # 玩家思考時 AI 先算
 
-    def setup_online(self):
-        self.ask_nickname() # 先問名字
+    def setup_online(self, watch=False):
+        """ watch=True 時以觀戰者身分連線，只看不下 """
+        if not watch: self.ask_nickname() # 先問名字
         ip = simpledialog.askstring("連線", "輸入伺服器 IP (本機測試輸入 127.0.0.1):", initialvalue="127.0.0.1")
         if not ip: return
+        room = 0
+        if watch:
+            room = simpledialog.askinteger("觀戰", "輸入房號 (0 為最新一局):", initialvalue=0, minvalue=0)
+            if room is None: return
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((ip, 5555))
-            self.mode = "PVP"
-            self.difficulty = "PVP"
-            self.lbl_diff_display.config(text=f"玩家: {self.player_name} (連線中)")
-            t = threading.Thread(target=self.receive_data, daemon=True)
-            t.start()
+            self.writer = protocol.FrameWriter(self.socket)
+            self.mode = "WATCH" if watch else "PVP"
+            self.difficulty = self.mode
+            # 先切到遊戲畫面 (會重設棋盤與倒數)，再送 HELLO、開接收執行緒，才不會把收到的快照 / 倒數洗掉
             self.show_frame("GAME")
-            self.lbl_status.config(text="連線中...等待對手")
+            self.lbl_diff_display.config(text="觀戰中" if watch else f"玩家: {self.player_name} (連線中)")
+            self.lbl_status.config(text="連線中...等待棋局" if watch else "連線中...等待對手")
+            self.writer.queue(protocol.hello(watch=room if watch else None))
+            self.writer.flush()
+            # 每條連線一個新佇列，舊連線的執行緒收到的東西不會混進來
+            self.net_frames = queue.Queue()
+            t = threading.Thread(target=self.receive_data, args=(self.socket, self.net_frames), daemon=True)
+            t.start()
+            self.poll_network()
         except Exception as e:
             messagebox.showerror("錯誤", f"無法連線: {e}")
+            if self.socket: self.back_to_menu()
 
     def reset_game(self):
-        self.board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
-        self.history = []
+        self.ai.cancel()
+        if self.timer_job:
+            self.root.after_cancel(self.timer_job)
+            self.timer_job = None
+        self.board = Board()
+        self.history = self.board.history
         self.current_player = 1
         self.game_over = False
         self.timer_seconds = TIME_LIMIT
@@ -244,13 +429,24 @@ class GomokuApp:
         self.clear_effects() # 重置時清除特效
 
     def back_to_menu(self):
+        self.ai.cancel()
+        # 中途離開的對局不會逾時判負，也不寫棋譜
+        if self.timer_job:
+            self.root.after_cancel(self.timer_job)
+            self.timer_job = None
+        self.game_over = True
+        self.replay_bar.pack_forget()
         if self.socket:
             self.socket.close()
             self.socket = None
+            self.writer = None
         self.clear_effects()
         self.show_frame("MENU")
 
     def start_timer(self):
+        if self.timer_job:
+            self.root.after_cancel(self.timer_job)
+            self.timer_job = None
         if self.game_over: return
         if self.mode == "PVE" and self.current_player == 2: return 
         self.lbl_timer.config(text=f"時間: {self.timer_seconds}")
@@ -258,11 +454,13 @@ class GomokuApp:
             self.handle_timeout()
             return
         self.timer_seconds -= 1
-        self.root.after(1000, self.start_timer)
+        self.timer_job = self.root.after(1000, self.start_timer)
 
     def handle_timeout(self):
         if self.game_over: return
+        if self.mode in ("PVP", "WATCH"): return # 線上對戰由伺服器判定逾時，等 RESULT
         self.game_over = True
+        self.save_record(3 - self.current_player, protocol.TIMEOUT)
         winner = "白棋" if self.current_player == 1 else "黑棋"
         messagebox.showinfo("時間到", f"時間到！{winner} 獲勝！")
         # 觸發特效 (時間到判負)
@@ -270,30 +468,13 @@ class GomokuApp:
         else: self.start_fireworks() # 玩家贏
 
     def make_move(self, r, c):
-        self.board[r][c] = self.current_player
-        self.history.append((r, c))
+        self.board.make(r, c, self.current_player)
         self.draw_board()
         
-        win_info = self.check_win(r, c, self.current_player)
+        # 線上對戰由伺服器判定勝負，收到 RESULT 才結束
+        win_info = None if self.mode in ("PVP", "WATCH") else self.board.win_line(r, c, self.current_player)
         if win_info:
-            self.game_over = True
-            self.draw_win_line(win_info)
-            
-            # === 判斷要放煙火還是下雨 ===
-            is_player_win = False
-            if self.mode == "PVE":
-                if self.current_player == 1: is_player_win = True
-            elif self.mode == "PVP":
-                if self.current_player == self.my_color: is_player_win = True
-            
-            if is_player_win:
-                self.lbl_status.config(text=f"恭喜 {self.player_name} 獲勝！")
-                self.start_fireworks()
-                messagebox.showinfo("遊戲結束", "恭喜獲勝！")
-            else:
-                self.lbl_status.config(text="遺憾落敗...")
-                self.start_rain()
-                messagebox.showinfo("遊戲結束", "你輸了...")
+            self.end_game(self.current_player, win_info)
         else:
             self.current_player = 3 - self.current_player
             self.timer_seconds = TIME_LIMIT 
@@ -301,6 +482,85 @@ class GomokuApp:
             if not (self.mode == "PVE" and self.current_player == 2):
                 self.start_timer()
 
+    def end_game(self, winner, win_info=None, reason=protocol.FIVE):
+        self.game_over = True
+        if win_info: self.draw_win_line(win_info)
+        self.save_record(winner, reason)
+        
+        # === 判斷要放煙火還是下雨 ===
+        is_player_win = False
+        if self.mode == "PVE":
+            if winner == 1: is_player_win = True
+        elif self.mode == "PVP":
+            if winner == self.my_color: is_player_win = True
+        
+        if winner == 0:
+            self.lbl_status.config(text="平手")
+            messagebox.showinfo("遊戲結束", "平手！")
+        elif self.mode == "WATCH":
+            text = f"{'黑棋' if winner == 1 else '白棋'}獲勝！"
+            self.lbl_status.config(text=text)
+            self.start_fireworks()
+            messagebox.showinfo("遊戲結束", text)
+        elif is_player_win:
+            self.lbl_status.config(text=f"恭喜 {self.player_name} 獲勝！")
+            self.start_fireworks()
+            messagebox.showinfo("遊戲結束", "恭喜獲勝！")
+        else:
+            self.lbl_status.config(text="遺憾落敗...")
+            self.start_rain()
+            messagebox.showinfo("遊戲結束", "你輸了...")
+
+    def save_record(self, winner, reason):
+        """ 單機對局結束時寫入棋譜 (線上對局由伺服器紀錄) """
+        if self.mode != "PVE": return
+        try:
+            self.records.append(self.history, winner, reason, records.PVE)
+        except OSError:
+            pass
+
+    # ================= 棋譜回放 =================
+
+    def start_replay(self):
+        if len(self.records) == 0:
+            messagebox.showinfo("棋譜回放", "目前還沒有任何棋譜")
+            return
+        self.ai.cancel()
+        self.mode = "REPLAY"
+        self.difficulty = "REPLAY"
+        self.show_frame("GAME")
+        self.replay_bar.pack(fill=tk.X, padx=10, pady=5, before=self.btn_undo)
+        self.load_replay(len(self.records) - 1)
+
+    def load_replay(self, index):
+        """ 透過索引直接讀出第 index 局，從空棋盤開始 """
+        if not 0 <= index < len(self.records): return
+        self.replay_index = index
+        self.replay = self.records.get(index)
+        self.clear_effects()
+        self.board = Board()
+        self.history = self.board.history
+        mode = {records.PVE: "單機", records.PVP: "線上", records.SELFPLAY: "自我對弈"}.get(self.replay.mode, "")
+        self.lbl_diff_display.config(text=f"棋譜 {index + 1}/{len(self.records)} ({mode}, {len(self.replay.moves)} 手)")
+        self.lbl_timer.config(text="")
+        self.replay_step(0)
+
+    def replay_step(self, delta):
+        if not self.replay: return
+        moves = self.replay.coords()
+        if delta > 0 and len(self.history) < len(moves):
+            r, c = moves[len(self.history)]
+            self.board.make(r, c, self.board.side_to_move())
+        elif delta < 0 and self.history:
+            self.board.unmake()
+        self.clear_effects()
+        self.draw_board()
+        n = len(self.history)
+        self.lbl_status.config(text=f"第 {n} / {len(moves)} 手")
+        if n == len(moves) and n and self.replay.reason == protocol.FIVE and self.replay.winner:
+            win_info = self.board.win_line(*self.history[-1], self.replay.winner)
+            if win_info: self.draw_win_line(win_info)
+
     def update_status(self):
         turn_text = "黑棋回合" if self.current_player == 1 else "白棋回合"
         if self.mode == "PVP":
@@ -309,162 +569,191 @@ class GomokuApp:
         self.lbl_status.config(text=turn_text)
 
     # ... (其餘繪圖、連線、AI 邏輯與之前相同，為節省篇幅省略重複部分，但請保留原本的邏輯) ...
-    # 請確保以下函式存在：check_win, computer_move, evaluate, check_line_strength, undo_move, send_chat, receive_data, log_chat
-    # 這裡我將必要的 check_win 和 computer_move 補上確保完整性
+    # 請確保以下函式存在：computer_move, undo_move, send_chat, receive_data, log_chat
+    # 這裡我將必要的 computer_move 補上確保完整性 (勝負判斷改由 board.py 負責)
     
     def on_click(self, event):
-        if self.game_over: return
+        if self.game_over or self.mode in ("REPLAY", "WATCH"): return
         if self.mode == "PVE" and self.current_player != 1: return
         if self.mode == "PVP" and self.current_player != self.my_color: return
 
-        c = int((event.x - OFFSET + CELL_SIZE / 2) // CELL_SIZE)
-        r = int((event.y - OFFSET + CELL_SIZE / 2) // CELL_SIZE)
+        r, c = self.view.cell_at(event.x, event.y)
 
-        if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE and self.board[r][c] == 0:
+        if self.board.in_bounds(r, c) and self.board.is_empty(r, c):
+            if self.mode == "PVP":
+                # 等伺服器確認後回傳 MOVE 才真正落子
+                self.send_frame(protocol.encode_move(r, c))
+                return
             self.make_move(r, c)
-            if self.mode == "PVP" and self.socket:
-                self.socket.send(f"MOVE:{r},{c}".encode('utf-8'))
             if not self.game_over and self.mode == "PVE":
-                self.root.after(500, self.computer_move)
+                self.computer_move()
 
     def draw_board(self):
-        if self.effect_running: return # 特效運作時不重畫背景，以免閃爍
-        self.canvas.delete("all")
-        for i in range(BOARD_SIZE):
-            self.canvas.create_line(OFFSET, OFFSET + i * CELL_SIZE, OFFSET + (BOARD_SIZE-1)*CELL_SIZE, OFFSET + i * CELL_SIZE)
-            self.canvas.create_line(OFFSET + i * CELL_SIZE, OFFSET, OFFSET + i * CELL_SIZE, OFFSET + (BOARD_SIZE-1)*CELL_SIZE)
-        star_points = [(3, 3), (3, 11), (7, 7), (11, 3), (11, 11)]
-        for sr, sc in star_points:
-             sx, sy = OFFSET + sc * CELL_SIZE, OFFSET + sr * CELL_SIZE
-             self.canvas.create_oval(sx-3, sy-3, sx+3, sy+3, fill="black")
-        stone_r = CELL_SIZE // 2 - 4
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if self.board[r][c] != 0:
-                    cx, cy = OFFSET + c * CELL_SIZE, OFFSET + r * CELL_SIZE
-                    color = "black" if self.board[r][c] == 1 else "white"
-                    self.canvas.create_oval(cx - stone_r, cy - stone_r, cx + stone_r, cy + stone_r, fill=color)
-                    if self.history and (r, c) == self.history[-1]:
-                         self.canvas.create_oval(cx-3, cy-3, cx+3, cy+3, fill="red", outline="red")
-                         
+        """ 把畫面上的棋子同步成目前棋盤 (增量更新，不會整個重畫) """
+        self.view.sync(self.board)
+
     def draw_win_line(self, win_info):
-        r1, c1, r2, c2 = win_info
-        x1 = OFFSET + c1 * CELL_SIZE
-        y1 = OFFSET + r1 * CELL_SIZE
-        x2 = OFFSET + c2 * CELL_SIZE
-        y2 = OFFSET + r2 * CELL_SIZE
-        self.canvas.create_line(x1, y1, x2, y2, fill="red", width=5, tags="effect")
+        self.view.draw_win_line(win_info)
 
     def undo_move(self):
+        if self.mode in ("REPLAY", "WATCH"): return
         if self.mode == "PVP":
             messagebox.showwarning("提示", "線上對戰禁止悔棋！")
             return
-        if len(self.history) < 2: return
-        for _ in range(2):
-            r, c = self.history.pop()
-            self.board[r][c] = 0
+        self.ai.cancel()
+        # AI 還在想的話只退回玩家剛下的那一手；對局已結束則照舊退兩手
+        n = 1 if self.current_player == 2 and not self.game_over else 2
+        if len(self.history) < n: return
+        for _ in range(n):
+            self.board.unmake()
+        self.current_player = 1
         self.draw_board()
+        if not self.game_over:
+            self.update_status()
+            # 輪回玩家，倒數重新開始 (AI 思考時倒數是停的)
+            self.timer_seconds = TIME_LIMIT
+            self.start_timer()
+            self.ai.ponder(self.board, 1)
 
     def send_chat(self, event=None):
+        if self.mode == "WATCH":
+            self.log_chat("系統", "觀戰中不能發言")
+            self.entry_msg.delete(0, tk.END)
+            return
         if self.mode == "PVE":
             self.log_chat("系統", "跟電腦講話，它不會理你喔...")
             self.entry_msg.delete(0, tk.END)
             return
         msg = self.entry_msg.get()
-        if msg and self.socket:
-            self.socket.send(f"CHAT:{msg}".encode('utf-8'))
+        if msg and self.writer:
+            self.send_frame(protocol.encode_chat(msg))
             self.log_chat(self.player_name, msg)
             self.entry_msg.delete(0, tk.END)
 
+    def send_frame(self, frame):
+        """ 先排隊，這次事件處理完 (after_idle) 才合併成一次 sendall """
+        if not self.writer: return
+        self.writer.queue(frame)
+        if not self.flush_job:
+            self.flush_job = self.root.after_idle(self.flush_frames)
+
+    def flush_frames(self):
+        self.flush_job = None
+        if not self.writer: return
+        try:
+            self.writer.flush()
+        except OSError:
+            self.log_chat("系統", "連線中斷，訊息未送出")
+
     def log_chat(self, sender, msg):
         self.chat_area.config(state='normal')
         self.chat_area.insert(tk.END, f"{sender}: {msg}\n")
         self.chat_area.see(tk.END)
         self.chat_area.config(state='disabled')
 
-    def receive_data(self):
+    def receive_data(self, sock, frames):
+        """ 背景執行緒：只負責收資料、切封包，放進佇列 (Tk 元件不能跨執行緒操作) """
+        parser = protocol.FrameParser() # 一次 recv 可能有好幾個封包，也可能只有半個
         while True:
             try:
-                data = self.socket.recv(1024).decode('utf-8')
+                data = sock.recv(65536)
                 if not data: break
-                if data.startswith("COLOR:"):
-                    color = data.split(":")[1]
-                    self.my_color = 1 if color == "BLACK" else 2
-                    self.root.title(f"五子棋 (線上: {'黑棋' if self.my_color==1 else '白棋'})")
-                elif data.startswith("MOVE:"):
-                    _, coords = data.split(":")
-                    r, c = map(int, coords.split(","))
-                    self.make_move(r, c)
-                elif data.startswith("CHAT:"):
-                    msg = data.split(":", 1)[1]
-                    self.log_chat("對手", msg)
+                for frame in parser.feed(data):
+                    frames.put(frame)
             except: break
 
+    def poll_network(self):
+        """ 主迴圈定時取出收到的封包處理；回主選單 (socket 關閉) 後停止 """
+        if self.net_job:
+            self.root.after_cancel(self.net_job)
+            self.net_job = None
+        if self.socket is None: return
+        frames = self.net_frames
+        while True:
+            try:
+                kind, payload = frames.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_frame(kind, payload)
+            if self.net_frames is not frames: return # 處理途中換了連線
+        self.net_job = self.root.after(20, self.poll_network)
+
+    def handle_frame(self, kind, payload):
+        if kind == protocol.COLOR:
+            self.my_color = payload[0]
+            self.root.title(f"五子棋 (線上: {'黑棋' if self.my_color==1 else '白棋'})")
+        elif kind == protocol.START:
+            self.update_status()
+        elif kind == protocol.MOVE:
+            r, c = protocol.decode_move(payload)
+            self.make_move(r, c)
+        elif kind == protocol.CHAT:
+            self.log_chat("對手", payload.decode('utf-8', 'ignore'))
+        elif kind == protocol.RESULT:
+            if self.game_over: return
+            winner, reason = payload[0], payload[1]
+            last = self.board.last_move()
+            win_info = None
+            if reason == protocol.FIVE and winner and last:
+                win_info = self.board.win_line(last[0], last[1], winner)
+            self.end_game(winner, win_info, reason)
+        elif kind == protocol.REJECT:
+            self.log_chat("系統", "伺服器拒絕了這一手")
+        elif kind == protocol.SNAPSHOT:
+            # 中途觀戰：一次重建目前的棋盤
+            room_id, moves = protocol.decode_snapshot(payload)
+            self.board = Board()
+            self.history = self.board.history
+            for r, c in moves:
+                self.board.make(r, c, self.board.side_to_move())
+            self.current_player = self.board.side_to_move()
+            self.lbl_diff_display.config(text=f"觀戰中 (房號 {room_id})")
+            self.draw_board()
+            self.update_status()
+        elif kind == protocol.TIME:
+            # 伺服器只在換手時送一次剩餘時間，之間由本地倒數顯示
+            _, seconds = protocol.decode_time(payload)
+            self.timer_seconds = seconds
+            self.start_timer()
+
     def computer_move(self):
-        if self.game_over: return
-        best_score = -99999
-        best_move = (7, 7)
-        if self.difficulty == "Easy" and random.random() < 0.3:
-            empty = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE) if self.board[r][c] == 0]
-            if empty: self.make_move(*random.choice(empty))
+        """ 請背景 AI 落子 (搜尋邏輯在 engine.py，深度與時間依難度而定) """
+        if self.game_over or self.board.is_full(): return
+        self.ai.think(self.board, self.current_player)
+        self.poll_ai()
+
+    def poll_ai(self):
+        """ 主迴圈定時檢查 AI 結果；悔棋或回主選單後舊結果會被丟掉 """
+        if self.game_over or self.mode != "PVE" or self.current_player != 2: return
+        move = self.ai.poll()
+        if move is None:
+            self.root.after(20, self.poll_ai)
             return
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if self.board[r][c] == 0:
-                    score = self.evaluate(r, c)
-                    if score > best_score:
-                        best_score = score
-                        best_move = (r, c)
-        self.make_move(*best_move)
-
-    def evaluate(self, r, c):
-        defense_weight = 1.0
-        if self.difficulty == "Easy": defense_weight = 0.5
-        elif self.difficulty == "Normal": defense_weight = 1.2
-        elif self.difficulty == "Hard": defense_weight = 2.0
-        atk = self.check_line_strength(r, c, 2)
-        dfs = self.check_line_strength(r, c, 1)
-        return atk + dfs * defense_weight 
-
-    def check_line_strength(self, r, c, player):
-        score = 0
-        dirs = [(0,1), (1,0), (1,1), (1,-1)]
-        for dr, dc in dirs:
-            count = 1
-            for step in range(1, 5): 
-                nr, nc = r+dr*step, c+dc*step
-                if 0<=nr<BOARD_SIZE and 0<=nc<BOARD_SIZE and self.board[nr][nc] == player: count+=1
-                else: break
-            for step in range(1, 5): 
-                nr, nc = r-dr*step, c-dc*step
-                if 0<=nr<BOARD_SIZE and 0<=nc<BOARD_SIZE and self.board[nr][nc] == player: count+=1
-                else: break
-            if count >= 5: score += 10000
-            elif count == 4: score += 1000
-            elif count == 3: score += 100
-            elif count == 2: score += 10
-        return score
-
-    def check_win(self, r, c, player):
-        dirs = [(0,1), (1,0), (1,1), (1,-1)]
-        for dr, dc in dirs:
-            start_r, start_c = r, c
-            while 0 <= start_r-dr < BOARD_SIZE and 0 <= start_c-dc < BOARD_SIZE and self.board[start_r-dr][start_c-dc] == player:
-                start_r -= dr
-                start_c -= dc
-            end_r, end_c = r, c
-            while 0 <= end_r+dr < BOARD_SIZE and 0 <= end_c+dc < BOARD_SIZE and self.board[end_r+dr][end_c+dc] == player:
-                end_r += dr
-                end_c += dc
-            dist = max(abs(end_r - start_r), abs(end_c - start_c))
-            if dist >= 4:
-                return (start_r, start_c, end_r, end_c)
-        return None
-    
+        self.show_stats(self.ai.last_stats)
+        if self.board.is_empty(*move):
+            self.make_move(*move)
+            if not self.game_over:
+                self.ai.ponder(self.board, self.current_player)
+
+    def show_stats(self, stats):
+        if stats.get("source") != "search":
+            self.lbl_stats.config(text={"ponder": "預先算好 (ponder)", "book": "開局庫", "threat": "連續衝四 / 活三",
+                                         "random": "隨機"}.get(stats.get("source"), ""))
+            return
+        self.lbl_stats.config(text=f"深度 {stats['depth']}  節點 {stats['nodes']}\n"
+                                   f"{stats['nps'] / 1000:.1f}k nps  TT {stats['tt_hit_rate']:.0%}\n"
+                                   f"最佳手 {stats['first_best_time']:.2f}s / {stats['time']:.2f}s")
+
     def on_resize(self, event):
-        self.draw_board()
+        self.view.schedule_layout(event.width, event.height)
 
 if __name__ == "__main__":
+    # 選用：GOMOKU_METRICS_PORT 開本機統計頁，GOMOKU_PROFILE 指定 cProfile 輸出檔
+    if os.environ.get("GOMOKU_METRICS_PORT"):
+        metrics.serve(int(os.environ["GOMOKU_METRICS_PORT"]))
+    if os.environ.get("GOMOKU_PROFILE"):
+        metrics.enable_profiling()
     root = tk.Tk()
     app = GomokuApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    metrics.dump_profile(os.environ.get("GOMOKU_PROFILE"))
\ No newline at end of file
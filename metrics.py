@@ -0,0 +1,205 @@
+""" 效能統計：計數器 / 每秒速率 / 延遲直方圖，可用本機 HTTP 以純文字查詢，並可選擇對熱點函式開 cProfile """
+import bisect
+import cProfile
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方圖的上界 (秒)：1µs ~ 10s，約每 2.5 倍一格
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+RATE_WINDOW = 60  # 速率以最近幾秒計算
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    """ 目前的值；也可以給一個函式，查詢時才計算 (例如房間數) """
+
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.func() if self.func else self.value
+
+
+class Meter:
+    """ 總次數 + 最近 RATE_WINDOW 秒的平均每秒次數 (每秒一格的環狀陣列) """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.total = 0
+        self.buckets = [0] * RATE_WINDOW
+        self.second = int(clock())
+
+    def _advance(self):
+        now = int(self.clock())
+        if now != self.second:
+            for s in range(self.second + 1, min(now, self.second + RATE_WINDOW) + 1):
+                self.buckets[s % RATE_WINDOW] = 0
+            self.second = now
+
+    def mark(self, n=1):
+        self._advance()
+        self.total += n
+        self.buckets[self.second % RATE_WINDOW] += n
+
+    def rate(self):
+        self._advance()
+        return sum(self.buckets) / RATE_WINDOW
+
+
+class Histogram:
+    """ 固定上界的直方圖，記錄 O(log 格數)；分位數以所在那一格的上界估計 """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """ 依名稱取得 (沒有就建立) 各種統計；render() 輸出 Prometheus 相容的純文字格式 """
+
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+
+    def _get(self, name, cls, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(*args)
+        return metric
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def gauge(self, name, func=None):
+        return self._get(name, Gauge, func)
+
+    def meter(self, name):
+        return self._get(name, Meter)
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS):
+        return self._get(name, Histogram, bounds)
+
+    def render(self):
+        lines = [f"uptime_seconds {time.time() - self.started:.1f}"]
+        for name, m in sorted(self.metrics.items()):
+            if isinstance(m, Counter):
+                lines.append(f"{name} {m.value}")
+            elif isinstance(m, Gauge):
+                lines.append(f"{name} {m.get()}")
+            elif isinstance(m, Meter):
+                lines.append(f"{name}_total {m.total}")
+                lines.append(f"{name}_per_second {m.rate():.2f}")
+            elif isinstance(m, Histogram):
+                seen = 0
+                for bound, n in zip(m.bounds, m.counts):
+                    seen += n
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {seen}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {m.count}')
+                lines.append(f"{name}_count {m.count}")
+                lines.append(f"{name}_sum {m.sum:.6f}")
+                for q in (0.5, 0.99):
+                    lines.append(f'{name}{{quantile="{q}"}} {m.quantile(q):g}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """ 在背景執行緒開一個只回傳統計文字的 HTTP 服務 (預設只聽本機)；回傳 server，可呼叫 shutdown() """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ================= cProfile =================
+
+_profiler = None
+_profiling = threading.local()
+
+
+def enable_profiling():
+    """ 之後呼叫 @profiled 的函式都會被 cProfile 記錄；沒開啟時只多一次全域變數檢查 """
+    global _profiler
+    _profiler = cProfile.Profile()
+    return _profiler
+
+
+def dump_profile(path):
+    if _profiler is not None:
+        _profiler.dump_stats(path)
+
+
+def profiled(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _profiler is None or getattr(_profiling, "active", False):
+            return func(*args, **kwargs)
+        # 巢狀呼叫時只在最外層開關，避免內層結束就把整個 profile 關掉
+        _profiling.active = True
+        try:
+            return _profiler.runcall(func, *args, **kwargs)
+        finally:
+            _profiling.active = False
+    return wrapper
@@ -0,0 +1,136 @@
+""" 多核心平行搜尋：根節點著法分給行程池，子行程透過 shared memory 共用同一張置換表 """
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from board import Board
+from engine import Engine, INF
+from transposition import TranspositionTable
+
+# 子行程內的全域狀態 (由 initializer 建立，整個行程池存活期間沿用)
+_engine = None
+_shm = None
+
+
+def _init_worker(shm_name, tt_mb, level):
+    global _engine, _shm
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _engine = Engine(level)
+    _engine.tt = TranspositionTable(tt_mb, buffer=_shm.buf)
+
+
+def _search_chunk(history, player, moves, depth, time_limit, age):
+    """ 子行程：重建局面，只搜分到的根節點著法 """
+    board = Board()
+    for r, c, p in history:
+        board.make(r, c, p)
+    _engine.tt.age = age
+    score, move = _engine.analyse(board, player, moves, depth, time_limit)
+    return score, move, _engine.nodes, _engine.depth_reached
+
+
+class ParallelSearch:
+    """ 根節點分割 (root-split)：排序後的根節點著法輪流分給每個行程 """
+
+    def __init__(self, workers=None, level="Hard", tt_mb=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.tt_mb = tt_mb
+        self.engine = Engine(level, tt_mb=tt_mb)  # 主行程只用來排序根節點著法
+        self.shm = shared_memory.SharedMemory(create=True, size=TranspositionTable.bytes_needed(tt_mb))
+        self.tt = TranspositionTable(tt_mb, buffer=self.shm.buf)
+        self.engine.tt = self.tt
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.shm.name, tt_mb, level))
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def search(self, board, player, max_depth=None, time_limit=None):
+        """ 回傳 (分數, 著法) """
+        if board.is_full():
+            return None, None
+        engine = self.engine
+        max_depth = max_depth or engine.max_depth
+        time_limit = engine.time_limit if time_limit is None else time_limit
+        self.tt.new_search()
+
+        root_moves = engine.ordered_moves(board, player, engine.width * 2)
+        history = [(r, c, board.get(r, c)) for r, c in board.history]
+        chunks = [root_moves[i::self.workers] for i in range(self.workers)]
+        futures = [self.pool.submit(_search_chunk, history, player, chunk, max_depth, time_limit, self.tt.age)
+                   for chunk in chunks if chunk]
+
+        best_score, best_move = -INF, root_moves[0]
+        self.nodes = 0
+        self.depth_reached = max_depth
+        for f in futures:
+            score, move, nodes, depth = f.result()
+            self.nodes += nodes
+            # 各行程深度可能不同 (時間到)，以最淺的當作整體深度
+            self.depth_reached = min(self.depth_reached, depth)
+            if score > best_score:
+                best_score, best_move = score, move
+        return best_score, best_move
+
+    def close(self):
+        self.pool.shutdown()
+        self.tt = self.engine.tt = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def measure_speedup(board, player, depth, workers, level="Hard", tt_mb=64):
+    """ 固定深度下，單行程與多行程搜尋的耗時比較 """
+    single = Engine(level, tt_mb=tt_mb)
+    start = time.perf_counter()
+    single.tt.new_search()
+    s_score, s_move = single.analyse(board, player, max_depth=depth, time_limit=INF)
+    single_time = time.perf_counter() - start
+
+    par = ParallelSearch(workers, level, tt_mb)
+    try:
+        # 先讓每個子行程完成初始化，不把開行程的時間算進去
+        list(par.pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        p_score, p_move = par.search(board, player, depth, time_limit=INF)
+        parallel_time = time.perf_counter() - start
+    finally:
+        par.close()
+
+    return {
+        "workers": workers,
+        "depth": depth,
+        "single_time": single_time,
+        "parallel_time": parallel_time,
+        "speedup": single_time / parallel_time if parallel_time else 0.0,
+        "single_nodes": single.nodes,
+        "parallel_nodes": par.nodes,
+        "single_move": s_move,
+        "parallel_move": p_move,
+        "same_score": s_score == p_score,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平行搜尋加速比測試")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--level", default="Hard")
+    parser.add_argument("--tt-mb", type=float, default=64)
+    parser.add_argument("--moves", default="7,7;7,8;8,8;6,6;8,7", help="開局手順，格式 r,c;r,c;...")
+    args = parser.parse_args()
+
+    board = Board()
+    for token in args.moves.split(";"):
+        if token:
+            r, c = map(int, token.split(","))
+            board.make(r, c, board.side_to_move())
+    result = measure_speedup(board, board.side_to_move(), args.depth, args.workers, args.level, args.tt_mb)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+""" 連線協定：2 bytes 長度 + 1 byte 類型 的封包格式，附舊版純文字協定的轉換 """
+import re
+import struct
+import threading
+
+from board import BOARD_SIZE
+
+VERSION = 2
+LEGACY_VERSION = 1
+
+# 封包類型
+HELLO = 1   # payload: 版本 (1 byte)，觀戰者再加房號 (4 bytes，0 表示最新一局)
+COLOR = 2   # payload: 1 黑 / 2 白
+START = 3
+MOVE = 4    # payload: r * BOARD_SIZE + c (1 byte)
+CHAT = 5    # payload: UTF-8 文字
+RESULT = 6  # payload: 勝方 (0 平手), 原因
+REJECT = 7  # payload: 被拒絕的 MOVE payload
+TIME = 8    # payload: 輪到誰 (1 byte), 剩餘秒數 (2 bytes)
+SNAPSHOT = 9  # payload: 房號 (4 bytes) + 目前為止的每一手 (各 1 byte)，給中途加入的觀戰者
+
+# RESULT 的原因
+FIVE, TIMEOUT, LEAVE, DRAW = 0, 1, 2, 3
+
+HEADER = struct.Struct(">HB")  # payload 長度, 類型
+MAX_PAYLOAD = 0xFFFF
+
+
+def encode(kind, payload=b""):
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def encode_move(r, c):
+    return encode(MOVE, bytes((r * BOARD_SIZE + c,)))
+
+
+def decode_move(payload):
+    return divmod(payload[0], BOARD_SIZE)
+
+
+def encode_result(winner, reason):
+    return encode(RESULT, bytes((winner, reason)))
+
+
+def encode_time(player, seconds):
+    return encode(TIME, bytes((player,)) + struct.pack(">H", seconds))
+
+
+def decode_time(payload):
+    return payload[0], struct.unpack_from(">H", payload, 1)[0]
+
+
+def encode_chat(text):
+    data = text.encode('utf-8')
+    if len(data) > MAX_PAYLOAD:
+        # 切在字元邊界，不要切出半個中文字
+        data = data[:MAX_PAYLOAD].decode('utf-8', 'ignore').encode('utf-8')
+    return encode(CHAT, data)
+
+
+def hello(version=VERSION, watch=None):
+    """
+    新版客戶端連線後第一個封包；開頭是 0x00，舊版文字訊息不可能這樣開頭。
+    watch 為房號時以觀戰者身分加入 (0 表示最新一局)。
+    """
+    payload = bytes((version,))
+    if watch is not None:
+        payload += struct.pack(">I", watch)
+    return encode(HELLO, payload)
+
+
+def decode_hello(payload):
+    """ 回傳 (版本, 觀戰房號或 None) """
+    watch = struct.unpack_from(">I", payload, 1)[0] if len(payload) >= 5 else None
+    return payload[0], watch
+
+
+def encode_snapshot(room_id, moves):
+    return encode(SNAPSHOT, struct.pack(">I", room_id) + bytes(r * BOARD_SIZE + c for r, c in moves))
+
+
+def decode_snapshot(payload):
+    """ 回傳 (房號, [(r, c), ...]) """
+    return struct.unpack_from(">I", payload)[0], [divmod(m, BOARD_SIZE) for m in payload[4:]]
+
+
+def is_framed(first_bytes):
+    return first_bytes[:1] == b"\x00"
+
+
+class FrameParser:
+    """ 增量解析：TCP 把封包黏在一起或切開都沒關係，緩衝區重複使用 """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        frames = []
+        pos, end = 0, len(buf)
+        while end - pos >= HEADER.size:
+            length, kind = HEADER.unpack_from(buf, pos)
+            if end - pos - HEADER.size < length:
+                break
+            start = pos + HEADER.size
+            frames.append((kind, bytes(buf[start:start + length])))
+            pos = start + length
+        if pos:
+            del buf[:pos]
+        return frames
+
+
+class FrameWriter:
+    """ 阻塞式 socket 用：先排隊，flush 時合併成一次 sendall (可跨執行緒呼叫)；何時 flush 由呼叫端決定 """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def queue(self, frame):
+        with self.lock:
+            self.pending.append(frame)
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            data = b"".join(self.pending)
+            self.pending.clear()
+            self.sock.sendall(data)
+
+
+# ================= 舊版文字協定 =================
+
+_LEGACY_MOVE = re.compile(r"MOVE:(\d+),(\d+)")
+
+
+def to_legacy(kind, payload):
+    """ 封包轉成舊版客戶端看得懂的文字；沒有對應的類型回傳 None """
+    if kind == COLOR:
+        return ("COLOR:BLACK" if payload[0] == 1 else "COLOR:WHITE").encode('utf-8')
+    if kind == START:
+        return b"START"
+    if kind == MOVE:
+        r, c = decode_move(payload)
+        return f"MOVE:{r},{c}".encode('utf-8')
+    if kind == CHAT:
+        return b"CHAT:" + payload
+    if kind == REJECT:
+        # 舊版客戶端已經先在本地落子，只能用聊天訊息告訴它這手不算
+        if len(payload) == 1 and payload[0] < BOARD_SIZE * BOARD_SIZE:
+            r, c = decode_move(payload)
+            return f"CHAT:[系統] 伺服器拒絕了 ({r},{c}) 這一手，棋盤已不同步".encode('utf-8')
+        return "CHAT:[系統] 伺服器拒絕了這一手".encode('utf-8')
+    if kind == RESULT and payload[1] == TIMEOUT:
+        # 五連由舊版客戶端自己判定 (而且緊接在 MOVE 之後送會黏在一起)，離線另有通知，只需補逾時
+        winner = "黑棋" if payload[0] == 1 else "白棋"
+        return f"CHAT:[系統] 時間到，{winner}獲勝".encode('utf-8')
+    return None
+
+
+def parse_legacy(data):
+    """ 舊版客戶端每次 send 一則訊息，沒有分隔；盡量把黏在一起的 MOVE 拆開 """
+    text = data.decode('utf-8', 'ignore')
+    if text.startswith("CHAT:"):
+        return [(CHAT, text[5:].encode('utf-8'))]
+    frames = []
+    for r, c in _LEGACY_MOVE.findall(text):
+        r, c = int(r), int(c)
+        if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+            frames.append((MOVE, bytes((r * BOARD_SIZE + c,))))
+    return frames
@@ -0,0 +1,118 @@
+""" 棋譜紀錄：只會附加的紀錄檔 (每手 1 byte) + 位移索引，可以串流讀取上百萬局而不用整個載入 """
+import os
+import struct
+import time
+from collections import namedtuple
+
+from board import BOARD_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只靠 fstat 取位移
+    fcntl = None
+
+MAGIC = b"GR"
+# magic, 模式, 勝方 (0 平手), 原因 (與 protocol 的 RESULT 原因相同), 保留, 手數, 時間戳
+HEADER = struct.Struct("<2sBBBBHI")
+OFFSET = struct.Struct("<Q")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "games")
+
+# 模式
+PVE, PVP, SELFPLAY = 0, 1, 2
+
+
+class GameRecord(namedtuple("GameRecord", "mode winner reason timestamp moves")):
+    """ moves 為 bytes，每手 r * BOARD_SIZE + c """
+
+    def coords(self):
+        return [divmod(m, BOARD_SIZE) for m in self.moves]
+
+
+class GameStore:
+    """ path.dat 存棋譜本體，path.idx 存每一局在 .dat 中的起始位移 (8 bytes) """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.data_path = path + ".dat"
+        self.index_path = path + ".idx"
+        self.data_file = None
+        self.index_file = None
+
+    def _open_for_append(self):
+        if self.data_file is None:
+            self.data_file = open(self.data_path, "ab")
+            self.index_file = open(self.index_path, "ab")
+
+    def append(self, moves, winner, reason, mode=PVE, timestamp=None):
+        """
+        moves 為 [(r, c), ...]；先寫本體再寫索引，中途當機也不會有指向半筆資料的索引。
+        同一個檔案可能有別的行程也在附加，位移要看檔案實際大小 (tell() 看不到別人寫的)，並在寫入期間上鎖。
+        """
+        self._open_for_append()
+        body = bytes(r * BOARD_SIZE + c for r, c in moves)
+        ts = int(time.time() if timestamp is None else timestamp)
+        fd = self.data_file.fileno()
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            offset = os.fstat(fd).st_size
+            self.data_file.write(HEADER.pack(MAGIC, mode, winner, reason, 0, len(body), ts) + body)
+            self.data_file.flush()
+            self.index_file.write(OFFSET.pack(offset))
+            self.index_file.flush()
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.index_path) // OFFSET.size
+        except OSError:
+            return 0
+
+    def get(self, i):
+        """ 用索引隨機讀取第 i 局 (支援負數) """
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        with open(self.index_path, "rb") as f:
+            f.seek(i * OFFSET.size)
+            (offset,) = OFFSET.unpack(f.read(OFFSET.size))
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            return _read_record(f)
+
+    def __iter__(self):
+        return iter_games(self.data_path)
+
+    def close(self):
+        if self.data_file:
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = self.index_file = None
+
+
+def _read_record(f):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, mode, winner, reason, _, n, ts = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"棋譜檔損毀 (位移 {f.tell() - HEADER.size})")
+    moves = f.read(n)
+    if len(moves) < n:
+        return None  # 最後一筆寫到一半
+    return GameRecord(mode, winner, reason, ts, moves)
+
+
+def iter_games(data_path):
+    """ 依序串流讀出每一局；檔案用緩衝讀取，不會整個載入記憶體 """
+    if not os.path.exists(data_path):
+        return
+    with open(data_path, "rb", buffering=1 << 20) as f:
+        while True:
+            record = _read_record(f)
+            if record is None:
+                return
+            yield record
@@ -1,47 +1,392 @@
+import argparse
+import asyncio
+import itertools
+import math
+import multiprocessing
+import os
 import socket
-import threading
+import time
+
+from board import Board, TIME_LIMIT
+import metrics
+from metrics import REGISTRY, profiled
+import records
+from protocol import (FrameParser, encode, encode_result, encode_snapshot, encode_time, decode_hello, is_framed,
+                      parse_legacy, to_legacy,
+                      HELLO, COLOR, START, MOVE, CHAT, RESULT, REJECT, TIME, SNAPSHOT, VERSION, LEGACY_VERSION,
+                      FIVE, TIMEOUT, LEAVE, DRAW)
+from timerwheel import TimerWheel
 
 # 設定
 HOST = '0.0.0.0'
 PORT = 5555
+BACKLOG = 4096
+HELLO_TIMEOUT = 0.5  # 等這麼久沒收到 HELLO 就當作舊版文字客戶端
+SPECTATOR_BUFFER_LIMIT = 64 * 1024  # 觀戰者積欠超過這麼多 bytes 沒讀走就斷線
+
+# 統計 (以 --metrics-port 開本機文字統計頁查詢)
+CONNECTIONS = REGISTRY.counter("server_connections_total")
+OPEN_CONNECTIONS = REGISTRY.gauge("server_connections")
+MESSAGES_IN = REGISTRY.meter("server_messages_in")
+MESSAGES_OUT = REGISTRY.meter("server_messages_out")
+BYTES_OUT = REGISTRY.counter("server_bytes_out_total")
+SLOW_SPECTATORS = REGISTRY.counter("server_spectators_dropped_total")
+RELAY_LATENCY = REGISTRY.histogram("server_relay_seconds")        # 收到封包到轉送完成
+VALIDATE_LATENCY = REGISTRY.histogram("server_validate_seconds")  # 落子檢查 + 勝負判定
+
+
+class Player:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info('peername')
+        self.room = None
+        self.color = None
+        self.version = LEGACY_VERSION
+        self.parser = None
+        self.pending = []
+        self.spectator = False
+        self.watch_room = 0
+
+    def send(self, kind, payload=b"", frame=None):
+        """
+        非阻塞寫入；同一輪事件迴圈內排隊的封包合併成一次 write。
+        frame 為已編碼好的封包，廣播時所有連線共用同一份 bytes。
+        """
+        if self.writer.is_closing():
+            return
+        if self.spectator and self.writer.transport.get_write_buffer_size() > SPECTATOR_BUFFER_LIMIT:
+            # 讀太慢的觀戰者直接斷線 (重連會收到快照)，不讓它的緩衝區無限長大
+            self.writer.transport.abort()
+            SLOW_SPECTATORS.inc()
+            if self.room:
+                self.room.spectators.discard(self)
+            return
+        if self.version == LEGACY_VERSION:
+            # 舊版客戶端一次 recv 當一則訊息，不能合併
+            data = to_legacy(kind, payload)
+            if data:
+                self.writer.write(data)
+                MESSAGES_OUT.mark()
+                BYTES_OUT.inc(len(data))
+            return
+        self.pending.append(frame or encode(kind, payload))
+        if len(self.pending) == 1:
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        if self.pending and not self.writer.is_closing():
+            data = b"".join(self.pending)
+            self.writer.write(data)
+            MESSAGES_OUT.mark(len(self.pending))
+            BYTES_OUT.inc(len(data))
+        self.pending.clear()
+
+
+class Room:
+    """ 一間房剛好兩位玩家；棋盤以伺服器這份為準，由伺服器檢查落子與判定勝負 """
+
+    def __init__(self, room_id, black, white, wheel, store=None):
+        self.room_id = room_id
+        self.players = {1: black, 2: white}
+        black.room = white.room = self
+        black.color, white.color = 1, 2
+        self.board = Board()
+        self.finished = False
+        self.wheel = wheel
+        self.timer = None
+        self.store = store
+        self.result = None
+        self.spectators = set()
+        self.on_finish = None  # 由 Lobby 設定，對局結束時把房間移出列表
+
+    def opponent(self, player):
+        return self.players[3 - player.color]
+
+    def start(self):
+        # 黑棋在排隊時已經收過 COLOR
+        self.players[2].send(COLOR, b"\x02")
+        for p in self.players.values():
+            p.send(START)
+        self.start_turn()
+
+    def start_turn(self):
+        """ 換手時重設倒數，並把伺服器端的剩餘時間告訴雙方 (只在換手時送) """
+        self.wheel.cancel(self.timer)
+        self.timer = self.wheel.schedule(TIME_LIMIT, self.on_timeout)
+        self.broadcast(TIME, frame=encode_time(self.board.side_to_move(), TIME_LIMIT))
+
+    def on_timeout(self):
+        self.timer = None
+        if not self.finished:
+            self.finish(3 - self.board.side_to_move(), TIMEOUT)
+
+    def broadcast(self, kind, payload=b"", frame=None):
+        """ 雙方與所有觀戰者；只編碼一次 (也可以直接給編碼好的 frame) """
+        frame = frame or encode(kind, payload)
+        for p in self.players.values():
+            p.send(kind, payload, frame)
+        self.fan_out(kind, payload, frame)
+
+    def fan_out(self, kind, payload, frame):
+        for s in tuple(self.spectators):
+            s.send(kind, payload, frame)
+
+    def add_spectator(self, spectator):
+        """ 中途加入只送一個目前棋盤的快照，之後的事件照常轉送 """
+        spectator.room = self
+        self.spectators.add(spectator)
+        snapshot = encode_snapshot(self.room_id, self.board.history)
+        spectator.send(SNAPSHOT, frame=snapshot)
+        if self.finished:
+            spectator.send(RESULT, self.result)
+        elif self.timer is not None:
+            seconds = math.ceil(self.wheel.remaining(self.timer))
+            spectator.send(TIME, frame=encode_time(self.board.side_to_move(), seconds))
+
+    def close_spectators(self):
+        loop = asyncio.get_running_loop()
+        for s in self.spectators:
+            s.room = None
+            loop.call_soon(s.writer.close)  # 排在 flush 之後，結果封包會先送出
+        self.spectators.clear()
+
+    def relay(self, sender, kind, payload):
+        if kind == MOVE:
+            self.play(sender, payload)
+        elif kind == CHAT:
+            self.opponent(sender).send(kind, payload)
 
-server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server.bind((HOST, PORT))
-server.listen(2)
+    @profiled
+    def play(self, sender, payload):
+        """ 檢查輪次與落點；合法才寫入棋盤並通知雙方，勝負只看最後一手經過的四條線 """
+        start = time.perf_counter()
+        board = self.board
+        if (self.finished or sender.color != board.side_to_move()
+                or len(payload) != 1 or payload[0] >= board.size * board.size):
+            sender.send(REJECT, payload)
+            return
+        r, c = divmod(payload[0], board.size)
+        if not board.is_empty(r, c):
+            sender.send(REJECT, payload)
+            return
+        board.make(r, c, sender.color)
+        frame = encode(MOVE, payload)
+        for p in self.players.values():
+            # 舊版客戶端自己已經先下了，不能再回傳給它
+            if p is sender and p.version == LEGACY_VERSION:
+                continue
+            p.send(MOVE, payload, frame)
+        self.fan_out(MOVE, payload, frame)
+        won = board.is_win(r, c, sender.color)
+        VALIDATE_LATENCY.observe(time.perf_counter() - start)
+        if won:
+            self.finish(sender.color, FIVE)
+        elif board.is_full():
+            self.finish(0, DRAW)
+        else:
+            self.start_turn()
 
-print(f"🔥 五子棋伺服器已啟動 (Port: {PORT})，等待玩家連線...")
+    def finish(self, winner, reason):
+        self.finished = True
+        self.wheel.cancel(self.timer)
+        self.timer = None
+        self.result = bytes((winner, reason))
+        self.broadcast(RESULT, self.result, encode_result(winner, reason))
+        self.close_spectators()
+        if self.on_finish:
+            self.on_finish(self)
+        if self.store is not None:
+            self.store.append(self.board.history, winner, reason, records.PVP)
 
-clients = []
 
-def handle_client(client_socket):
-    while True:
+class Lobby:
+    """ 配對佇列 + 所有進行中的房間 """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.waiting = None
+        self.rooms = {}
+        self.room_ids = itertools.count(1)
+        self.wheel = TimerWheel()  # 所有房間共用一個時間輪，不是每局一個 timer task
+        REGISTRY.gauge("server_rooms", lambda: len(self.rooms))
+        REGISTRY.gauge("server_spectators", lambda: sum(len(r.spectators) for r in list(self.rooms.values())))
+        REGISTRY.gauge("server_timers", lambda: self.wheel.count)
+
+    def join(self, player):
+        if self.waiting is None:
+            self.waiting = player
+            player.send(COLOR, b"\x01")
+            return
+        black, self.waiting = self.waiting, None
+        room = Room(next(self.room_ids), black, player, self.wheel, self.store)
+        room.on_finish = self.close_room
+        self.rooms[room.room_id] = room
+        room.start()
+
+    def close_room(self, room):
+        """ 對局結束就不再算進進行中的房間，也不能再觀戰；雙方仍可聊天直到離線 """
+        self.rooms.pop(room.room_id, None)
+
+    def watch(self, spectator):
+        """ 房號 0 表示看最新開的一局 """
+        room_id = spectator.watch_room or max(self.rooms, default=None)
+        room = self.rooms.get(room_id)
+        if room is None:
+            spectator.send(CHAT, "目前沒有這場對局".encode('utf-8'))
+            asyncio.get_running_loop().call_soon(spectator.writer.close)
+            return
+        room.add_spectator(spectator)
+
+    def leave(self, player):
+        if player.spectator:
+            if player.room:
+                player.room.spectators.discard(player)
+            return
+        if self.waiting is player:
+            self.waiting = None
+        room = player.room
+        if room is None:
+            return
+        self.rooms.pop(room.room_id, None)
+        other = room.opponent(player)
+        if not room.finished:
+            room.finish(other.color, LEAVE)
+        other.room = None
+        other.send(CHAT, "對手已離線".encode('utf-8'))
+
+
+async def negotiate(player):
+    """ 新版客戶端一連線就送 HELLO；逾時沒送就是舊版。回傳第一批已讀到的資料 """
+    try:
+        first = await asyncio.wait_for(player.reader.read(4096), HELLO_TIMEOUT)
+    except asyncio.TimeoutError:
+        return b""
+    if not is_framed(first):
+        return first
+    parser = FrameParser()
+    frames = parser.feed(first)
+    # HELLO 可能被 TCP 切成好幾段，在同一個時限內繼續讀到完整為止
+    deadline = asyncio.get_running_loop().time() + HELLO_TIMEOUT
+    while not frames:
+        remaining = deadline - asyncio.get_running_loop().time()
         try:
-            message = client_socket.recv(1024)
-            if not message:
+            data = await asyncio.wait_for(player.reader.read(4096), max(0.0, remaining))
+        except asyncio.TimeoutError:
+            raise ConnectionError("HELLO 不完整") from None
+        if not data:
+            raise ConnectionError("連線在 HELLO 之前關閉")
+        frames = parser.feed(data)
+    if frames[0][0] != HELLO:
+        raise ConnectionError("第一個封包必須是 HELLO")
+    version, watch = decode_hello(frames[0][1])
+    player.version = min(version, VERSION)
+    player.parser = parser
+    if watch is not None:
+        player.spectator = True
+        player.watch_room = watch
+    player.send(HELLO, bytes((player.version,)))
+    return frames[1:]
+
+
+async def handle_client(reader, writer, lobby):
+    player = Player(reader, writer)
+    print(f"玩家連線: {player.addr}")
+    CONNECTIONS.inc()
+    OPEN_CONNECTIONS.set(OPEN_CONNECTIONS.get() + 1)
+    try:
+        first = await negotiate(player)
+        if player.spectator:
+            lobby.watch(player)
+            while await reader.read(4096):
+                pass  # 觀戰者是唯讀的，送來的資料一律忽略
+            return
+        lobby.join(player)
+        if player.version == LEGACY_VERSION:
+            frames = parse_legacy(first) if first else []
+        else:
+            frames = first
+        while True:
+            # 轉送訊息給同房的對手
+            MESSAGES_IN.mark(len(frames))
+            for kind, payload in frames:
+                if player.room:
+                    with RELAY_LATENCY.time():
+                        player.room.relay(player, kind, payload)
+            data = await reader.read(65536)
+            if not data:
                 break
-            # 廣播訊息給對手
-            for c in clients:
-                if c != client_socket:
-                    c.send(message)
-        except:
-            break
-    
-    if client_socket in clients:
-        clients.remove(client_socket)
-    client_socket.close()
-
-while True:
-    client_socket, addr = server.accept()
-    print(f"玩家連線: {addr}")
-    clients.append(client_socket)
-    
-    # 分配顏色
-    if len(clients) == 1:
-        client_socket.send("COLOR:BLACK".encode('utf-8'))
-    elif len(clients) == 2:
-        client_socket.send("COLOR:WHITE".encode('utf-8'))
-        # 通知兩邊遊戲開始
-        for c in clients: c.send("START".encode('utf-8'))
-    
-    thread = threading.Thread(target=handle_client, args=(client_socket,))
-    thread.start()
\ No newline at end of file
+            if player.version == LEGACY_VERSION:
+                frames = parse_legacy(data)
+            else:
+                frames = player.parser.feed(data)
+    except ConnectionError:
+        pass
+    finally:
+        OPEN_CONNECTIONS.set(OPEN_CONNECTIONS.get() - 1)
+        lobby.leave(player)
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT, reuse_port=False, records_path=None):
+    lobby = Lobby(records.GameStore(records_path) if records_path else None)
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(r, w, lobby), host, port,
+        backlog=BACKLOG, reuse_port=reuse_port or None)
+    print(f"🔥 五子棋伺服器已啟動 (Port: {port}, PID: {os.getpid()})，等待玩家連線...")
+    ticker = asyncio.create_task(lobby.wheel.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ticker.cancel()
+
+
+def run_worker(host, port, reuse_port, records_path=None, metrics_port=None, profile_path=None):
+    if metrics_port:
+        metrics.serve(metrics_port)
+    if profile_path:
+        metrics.enable_profiling()
+    try:
+        asyncio.run(serve(host, port, reuse_port, records_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.dump_profile(profile_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="五子棋伺服器")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=1, help="以 SO_REUSEPORT 分成多個行程，各自管理自己的房間")
+    parser.add_argument("--records", default=records.DEFAULT_PATH + "_server", help="棋譜檔路徑 (不含副檔名)，設為空字串則不紀錄")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在 127.0.0.1 的這個 port 提供文字統計頁 (多行程時第 i 個用 port + i)")
+    parser.add_argument("--profile", default=None, help="對落子處理開 cProfile，結束時寫到此檔 (多行程時加 .i)")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker(args.host, args.port, False, args.records, args.metrics_port, args.profile)
+        return
+    if not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("此平台不支援 SO_REUSEPORT，無法使用 --workers")
+    # 同一個 port 由核心把新連線分給各行程；同一個行程內的玩家才會被配對
+    # 每個行程寫自己的棋譜檔，索引裡的位移才不會互相錯開
+    procs = [multiprocessing.Process(target=run_worker, args=(args.host, args.port, True,
+                                                            args.records and f"{args.records}.{i}",
+                                                            args.metrics_port and args.metrics_port + i,
+                                                            args.profile and f"{args.profile}.{i}"))
+             for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
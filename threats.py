@@ -0,0 +1,205 @@
+""" 威脅空間搜尋：只展開衝四 (VCF) / 活三 (VCT) 這類逼著，在節點上限內找出必勝手順 """
+from board import BOARD_SIZE
+
+VCF_DEPTH = 12
+VCT_DEPTH = 6
+
+
+class BudgetExceeded(Exception):
+    """ 節點數用完，放棄這次搜尋 """
+
+
+def _build_lines(size):
+    """ 每條線：(遮罩所在的屬性名稱, 線編號, 合法位元下界, 上界, 位元 => 座標) """
+    lines = []
+    for r in range(size):
+        lines.append(("rows", r, 0, size - 1, [(r, b) for b in range(size)]))
+    for c in range(size):
+        lines.append(("cols", c, 0, size - 1, [(b, c) for b in range(size)]))
+    for d in range(2 * size - 1):
+        k = d - (size - 1)  # r - c，位元為欄
+        lo, hi = max(0, -k), min(size - 1, size - 1 - k)
+        if hi - lo >= 4:
+            lines.append(("diags", d, lo, hi, {b: (b + k, b) for b in range(lo, hi + 1)}))
+    for a in range(2 * size - 1):  # r + c，位元為欄
+        lo, hi = max(0, a - (size - 1)), min(size - 1, a)
+        if hi - lo >= 4:
+            lines.append(("antis", a, lo, hi, {b: (a - b, b) for b in range(lo, hi + 1)}))
+    return lines
+
+
+_LINES = {BOARD_SIZE: _build_lines(BOARD_SIZE)}
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def scan(board, player, want_threes=False):
+    """
+    掃描 player 的棋型，回傳 (fives, fours, threes)：
+      fives  : 下了就連五的點
+      fours  : 下了就形成衝四 / 活四的點 (值為可形成幾個四，用來排序)
+      threes : 下了就形成活三的點 => 對方的防守點 (只有 want_threes 時才算)
+    """
+    if board.size not in _LINES:
+        _LINES[board.size] = _build_lines(board.size)
+    p, o = player - 1, 2 - player
+    fives, fours, threes = set(), {}, {}
+    for attr, idx, lo, hi, cell in _LINES[board.size]:
+        masks = getattr(board, attr)
+        own = masks[p][idx]
+        if own & (own - 1) == 0:
+            continue  # 少於兩子，不會有任何威脅
+        opp = masks[o][idx]
+        count = own.bit_count()
+        if count >= 3:
+            for j in range(lo, hi - 3):
+                w = 31 << j
+                if opp & w:
+                    continue
+                n = (own & w).bit_count()
+                if n == 4:
+                    fives.add(cell[((w & ~own).bit_length() - 1)])
+                elif n == 3:
+                    for b in _bits(w & ~own):
+                        sq = cell[b]
+                        fours[sq] = fours.get(sq, 0) + 1
+        if want_threes:
+            # 6 格視窗：兩端空、中間四格有兩子兩空 => 中間的空點下了就是活三
+            for j in range(lo, hi - 4):
+                w = 63 << j
+                if opp & w or own & (1 << j) or own & (1 << (j + 5)):
+                    continue
+                inner = 30 << j
+                if (own & inner).bit_count() != 2:
+                    continue
+                defense = [cell[b] for b in _bits(w & ~own)]
+                for b in _bits(inner & ~own):
+                    sq = cell[b]
+                    threes.setdefault(sq, set()).update(d for d in defense if d != sq)
+    return fives, fours, threes
+
+
+class ThreatSolver:
+    def __init__(self, board, max_nodes):
+        self.board = board.copy()
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.failed = {}  # 局面雜湊 => 已證明在此深度內無解
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise BudgetExceeded()
+
+    def _ordered(self, moves):
+        return sorted(moves, key=lambda sq: -moves[sq])
+
+    def vcf(self, attacker, depth):
+        """ 連續衝四取勝；回傳 [攻, 守, 攻, 守, ..., 攻] 或 None """
+        self._tick()
+        board = self.board
+        defender = 3 - attacker
+        if self.failed.get(board.hash, -1) >= depth:
+            return None
+        a_fives, a_fours, _ = scan(board, attacker)
+        if a_fives:
+            return [next(iter(a_fives))]
+        d_fives, _, _ = scan(board, defender)
+        if len(d_fives) >= 2 or depth == 0:
+            return None
+        if d_fives:
+            # 對方已經衝四：只能下在擋點，而且擋的同時要能衝四
+            a_fours = {sq: n for sq, n in a_fours.items() if sq in d_fives}
+        for m in self._ordered(a_fours):
+            board.make(m[0], m[1], attacker)
+            fives, _, _ = scan(board, attacker)
+            if len(fives) >= 2:
+                # 兩個連五點 (活四 / 雙四)：對方只擋得住一個
+                board.unmake()
+                block, win = sorted(fives)[:2]
+                return [m, block, win]
+            (t,) = fives
+            board.make(t[0], t[1], defender)
+            line = self.vcf(attacker, depth - 1)
+            board.unmake()
+            board.unmake()
+            if line is not None:
+                return [m, t] + line
+        self.failed[board.hash] = depth
+        return None
+
+    def vct(self, attacker, depth):
+        """ 以衝四 + 活三連續進攻取勝；對方的每一種擋法 (含反衝四) 都要能贏 """
+        self._tick()
+        board = self.board
+        defender = 3 - attacker
+        if self.failed.get(board.hash, -1) >= depth:
+            return None
+        a_fives, a_fours, a_threes = scan(board, attacker, want_threes=True)
+        if a_fives:
+            return [next(iter(a_fives))]
+        d_fives, _, _ = scan(board, defender)
+        if len(d_fives) >= 2 or depth == 0:
+            return None
+        moves = dict(a_fours)
+        for sq in a_threes:
+            moves[sq] = moves.get(sq, 0)
+        if d_fives:
+            moves = {sq: n for sq, n in moves.items() if sq in d_fives}
+        for m in self._ordered(moves):
+            board.make(m[0], m[1], attacker)
+            fives, _, _ = scan(board, attacker)
+            if len(fives) >= 2:
+                # 兩個連五點 (活四 / 雙四)：對方只擋得住一個
+                board.unmake()
+                block, win = sorted(fives)[:2]
+                return [m, block, win]
+            if fives:
+                replies = list(fives)
+            else:
+                # 活三：對方可以擋三的任一個防守點，或自己衝四反擊
+                _, d_fours, _ = scan(board, defender)
+                replies = list(a_threes.get(m, ())) + [sq for sq in d_fours if sq not in a_threes.get(m, ())]
+            line = self._refute_all(attacker, defender, replies, depth)
+            board.unmake()
+            if line is not None:
+                return [m] + line
+        self.failed[board.hash] = depth
+        return None
+
+    def _refute_all(self, attacker, defender, replies, depth):
+        """ 對方所有回應都必須還能找到後續必勝；回傳第一種回應的手順 """
+        board = self.board
+        first = None
+        for d in replies:
+            if not board.is_empty(*d):
+                continue
+            board.make(d[0], d[1], defender)
+            line = self.vct(attacker, depth - 1)
+            board.unmake()
+            if line is None:
+                return None
+            if first is None:
+                first = [d] + line
+        return first
+
+
+def find_vcf(board, player, max_nodes=5000, depth=VCF_DEPTH):
+    """ player 若有連續衝四的必勝手順則回傳，否則 (或超過節點上限) 回傳 None """
+    try:
+        return ThreatSolver(board, max_nodes).vcf(player, depth)
+    except BudgetExceeded:
+        return None
+
+
+def find_vct(board, player, max_nodes=5000, depth=VCT_DEPTH):
+    """ player 若有衝四 / 活三的必勝手順則回傳，否則 (或超過節點上限) 回傳 None """
+    try:
+        return ThreatSolver(board, max_nodes).vct(player, depth)
+    except BudgetExceeded:
+        return None
@@ -0,0 +1,72 @@
+""" 時間輪：所有房間的逾時都掛在同一個輪子上，一個背景 task 每個 tick 只處理到期的那一格 """
+import asyncio
+import math
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "slot")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline  # 以 tick 計
+        self.callback = callback
+        self.slot = None
+
+
+class TimerWheel:
+    """
+    雜湊時間輪：timer 放在 deadline % slots 那一格，排程 / 取消都是 O(1)。
+    超過一圈的 timer 留在格子裡，等指針轉到它的 deadline 那一圈才觸發。
+    """
+
+    def __init__(self, tick=0.1, slots=512, clock=None):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.clock = clock or (lambda: asyncio.get_running_loop().time())
+        self.origin = None
+        self.current = 0  # 已處理到第幾個 tick
+        self.count = 0
+
+    def _now_tick(self):
+        now = self.clock()
+        if self.origin is None:
+            self.origin = now
+        return int((now - self.origin) / self.tick)
+
+    def schedule(self, delay, callback):
+        deadline = max(self._now_tick(), self.current) + max(1, math.ceil(delay / self.tick - 1e-9))
+        timer = Timer(deadline, callback)
+        timer.slot = self.slots[deadline % len(self.slots)]
+        timer.slot[timer] = None
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None and timer.slot is not None:
+            timer.slot.pop(timer, None)
+            timer.slot = None
+            self.count -= 1
+
+    def remaining(self, timer):
+        """ 剩餘秒數 """
+        return max(0.0, (timer.deadline - self._now_tick()) * self.tick)
+
+    def advance(self):
+        """ 把指針推進到現在，觸發途中所有到期的 timer """
+        target = self._now_tick()
+        n = len(self.slots)
+        while self.current < target:
+            self.current += 1
+            slot = self.slots[self.current % n]
+            if not slot:
+                continue
+            due = [t for t in slot if t.deadline <= self.current]
+            for timer in due:
+                del slot[timer]
+                timer.slot = None
+                self.count -= 1
+                timer.callback()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
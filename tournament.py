@@ -0,0 +1,171 @@
+""" 自我對弈賽：各難度兩兩對戰 (行程池平行)，統計勝率與 Elo 差 (含信賴區間)，棋譜存成 SELFPLAY 紀錄 """
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from board import Board, BOARD_SIZE
+from engine import Engine, LEVELS
+from protocol import FIVE, DRAW
+import records
+
+OPENING_PLIES = 3
+OPENING_RADIUS = 2  # 開局只在天元附近隨機擺子，避免一開始就有明顯優劣
+
+
+def make_openings(n, plies=OPENING_PLIES, seed=0):
+    """ 產生 n 組不重複的開局手順 (黑白交替)，每組會以兩種執黑方式各下一次 """
+    rng = random.Random(seed)
+    center = BOARD_SIZE // 2
+    area = [(center + dr, center + dc)
+            for dr in range(-OPENING_RADIUS, OPENING_RADIUS + 1)
+            for dc in range(-OPENING_RADIUS, OPENING_RADIUS + 1)]
+    openings, seen = [], set()
+    while len(openings) < n:
+        moves = tuple(rng.sample(area, plies))
+        if moves not in seen:
+            seen.add(moves)
+            openings.append(moves)
+    return openings
+
+
+def play_game(black_level, white_level, opening, seed, time_scale=1.0, max_depth=None, tt_mb=4):
+    """ 下一盤完整的棋，回傳 (勝方 0/1/2, 原因, 手順) """
+    engines = {1: Engine(black_level, seed, tt_mb), 2: Engine(white_level, seed + 1, tt_mb)}
+    board = Board()
+    for r, c in opening:
+        board.make(r, c, board.side_to_move())
+    while True:
+        player = board.side_to_move()
+        engine = engines[player]
+        depth = min(engine.max_depth, max_depth) if max_depth else None
+        move = engine.search(board, player, depth, engine.time_limit * time_scale)
+        if move is None:
+            return 0, DRAW, list(board.history)
+        r, c = move
+        board.make(r, c, player)
+        if board.is_win(r, c, player):
+            return player, FIVE, list(board.history)
+        if board.is_full():
+            return 0, DRAW, list(board.history)
+
+
+def _play_job(job):
+    a, b, black, opening, seed, time_scale, max_depth, tt_mb = job
+    white = b if black == a else a
+    winner, reason, moves = play_game(black, white, opening, seed, time_scale, max_depth, tt_mb)
+    return a, b, black, winner, reason, moves
+
+
+PRIOR_GAMES = 0.5  # 先驗：雙方各加半勝，全勝 / 全敗時也估得出有限的 Elo 差
+
+
+def elo_diff(wins, draws, losses, z=1.96):
+    """ 由勝 / 和 / 負估計 Elo 差與信賴區間 (逐局分數的常態近似，加上少量先驗)；沒有對局時回傳 None """
+    if wins + draws + losses == 0:
+        return None
+    wins += PRIOR_GAMES
+    losses += PRIOR_GAMES
+    n = wins + draws + losses
+    score = (wins + draws / 2) / n
+    elo = -400 * math.log10(1 / score - 1)
+    var = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / n
+    # d(Elo)/d(score) = 400 / (ln10 * s * (1 - s))
+    margin = z * math.sqrt(var / n) * 400 / (math.log(10) * score * (1 - score))
+    return elo, margin
+
+
+class Tournament:
+    """ 每對難度 x 每組開局 x 兩種執黑，所有對局丟進行程池 """
+
+    def __init__(self, levels, openings, workers=None, time_scale=1.0, max_depth=None, tt_mb=4, seed=0, store=None):
+        self.levels = levels
+        self.openings = openings
+        self.workers = workers or os.cpu_count() or 1
+        self.time_scale = time_scale
+        self.max_depth = max_depth
+        self.tt_mb = tt_mb
+        self.seed = seed
+        self.store = store
+        # (a, b) => [a 勝, 和, a 負]
+        self.results = {pair: [0, 0, 0] for pair in itertools.combinations(levels, 2)}
+
+    def jobs(self):
+        seed = self.seed
+        for a, b in self.results:
+            for opening in self.openings:
+                for black in (a, b):
+                    seed += 2
+                    yield a, b, black, opening, seed, self.time_scale, self.max_depth, self.tt_mb
+
+    def run(self, progress=None):
+        jobs = list(self.jobs())
+        done = 0
+        with ProcessPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(_play_job, job) for job in jobs]
+            for f in as_completed(futures):
+                a, b, black, winner, reason, moves = f.result()
+                self.record(a, b, black, winner)
+                if self.store is not None:
+                    # 只有主行程寫檔，紀錄檔不會被多個行程同時附加
+                    self.store.append(moves, winner, reason, records.SELFPLAY)
+                done += 1
+                if progress:
+                    progress(done, len(jobs))
+        return self.results
+
+    def record(self, a, b, black, winner):
+        tally = self.results[(a, b)]
+        if winner == 0:
+            tally[1] += 1
+        elif (winner == 1) == (black == a):
+            tally[0] += 1
+        else:
+            tally[2] += 1
+
+    def report(self):
+        lines = []
+        for (a, b), (w, d, l) in self.results.items():
+            est = elo_diff(w, d, l)
+            if est is None:
+                elo = "尚無對局"
+            else:
+                elo = f"{est[0]:+.0f} ± {est[1]:.0f}"
+            lines.append(f"{a:>6} vs {b:<6}  勝 {w:4d}  和 {d:4d}  負 {l:4d}  Elo 差 {elo}")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="難度自我對弈賽")
+    parser.add_argument("--levels", default=",".join(LEVELS), help="參賽難度，以逗號分隔")
+    parser.add_argument("--openings", type=int, default=50, help="開局組數 (每組交換先後手各下一次)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--time-scale", type=float, default=0.1, help="每步時間 = 難度設定的時間 x 此倍率")
+    parser.add_argument("--max-depth", type=int, default=None, help="限制搜尋深度 (預設依難度)")
+    parser.add_argument("--tt-mb", type=float, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--records", default=records.DEFAULT_PATH + "_selfplay", help="棋譜檔路徑，設為空字串則不紀錄")
+    args = parser.parse_args()
+
+    levels = [name for name in args.levels.split(",") if name]
+    for name in levels:
+        if name not in LEVELS:
+            parser.error(f"未知難度: {name}")
+    store = records.GameStore(args.records) if args.records else None
+    tournament = Tournament(levels, make_openings(args.openings, seed=args.seed), args.workers,
+                            args.time_scale, args.max_depth, args.tt_mb, args.seed, store)
+    start = time.perf_counter()
+    try:
+        tournament.run(lambda done, total: print(f"\r{done}/{total} 局", end="", flush=True))
+    finally:
+        if store is not None:
+            store.close()
+    print(f"\n耗時 {time.perf_counter() - start:.1f} 秒")
+    print(tournament.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+""" 置換表：固定記憶體上限 (MB)，兩格一桶，深度優先 + 世代淘汰 """
+from array import array
+
+# 邊界類型
+EXACT, LOWER, UPPER = 1, 2, 3
+
+NO_MOVE = 255
+ENTRY_BYTES = 16  # 8 bytes key + 8 bytes data
+BUCKET = 2
+
+# data 的位元配置：分數 32 | 深度 8 | 類型 2 | 著法 8 | 世代 8
+_SCORE_BIAS = 1 << 31
+
+
+def _pack(score, depth, flag, move, age):
+    return ((score + _SCORE_BIAS) & 0xFFFFFFFF) | (depth << 32) | (flag << 40) | (move << 42) | (age << 50)
+
+
+class TranspositionTable:
+    """
+    keys 存的是 key ^ data：多個行程共用同一塊記憶體時，
+    寫到一半的條目驗證不會通過，不需要上鎖。
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        n = max(BUCKET, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        n -= n % BUCKET
+        self.size = n
+        if buffer is None:
+            self.keys = array('Q', [0]) * n
+            self.data = array('Q', [0]) * n
+        else:
+            view = memoryview(buffer).cast('B')[:n * ENTRY_BYTES].cast('Q')
+            self.keys = view[:n]
+            self.data = view[n:]
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    @staticmethod
+    def bytes_needed(size_mb):
+        n = max(BUCKET, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        return (n - n % BUCKET) * ENTRY_BYTES
+
+    def new_search(self):
+        """ 每次正式搜尋前呼叫；舊世代的條目優先被取代 """
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        for i in range(self.size):
+            self.keys[i] = 0
+            self.data[i] = 0
+        self.age = 0
+
+    def probe(self, key):
+        """ 命中回傳 (score, depth, flag, move)，否則 None；move 為 r * size + c 或 NO_MOVE """
+        self.probes += 1
+        i = (key % (self.size // BUCKET)) * BUCKET
+        for j in (i, i + 1):
+            d = self.data[j]
+            if d and self.keys[j] ^ d == key:
+                self.hits += 1
+                return ((d & 0xFFFFFFFF) - _SCORE_BIAS, (d >> 32) & 0xFF, (d >> 40) & 0x3, (d >> 42) & 0xFF)
+        return None
+
+    def store(self, key, score, depth, flag, move=NO_MOVE):
+        i = (key % (self.size // BUCKET)) * BUCKET
+        victim = i
+        for j in (i, i + 1):
+            d = self.data[j]
+            if d and self.keys[j] ^ d == key:
+                # 同一局面：較淺的結果不覆蓋本世代較深的結果
+                if depth < (d >> 32) & 0xFF and (d >> 50) == self.age:
+                    return
+                if move == NO_MOVE:
+                    move = (d >> 42) & 0xFF
+                victim = j
+                break
+        else:
+            # 先淘汰舊世代，再淘汰深度較淺的
+            d0, d1 = self.data[i], self.data[i + 1]
+            k0 = ((d0 >> 50) == self.age, (d0 >> 32) & 0xFF)
+            k1 = ((d1 >> 50) == self.age, (d1 >> 32) & 0xFF)
+            victim = i if k0 <= k1 else i + 1
+        data = _pack(score, min(depth, 0xFF), flag, move, self.age)
+        self.data[victim] = data
+        self.keys[victim] = key ^ data
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0